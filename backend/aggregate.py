@@ -0,0 +1,90 @@
+# aggregate.py
+
+import numpy as np
+
+SOURCES = ("newsapi", "Twitter", "YouTube")
+# The response key each source's items are listed under.
+SOURCE_KEYS = {"newsapi": "articles", "Twitter": "twitter_posts", "YouTube": "youtube_posts"}
+LABELS = ("positive", "negative", "neutral")
+# Reasons recorded when no label could be obtained; those items carry a placeholder label and are not counted.
+UNCLASSIFIED_REASONS = ("Analysis failed", "Parsing failed")
+
+_SOURCE_CODES = {source: code for code, source in enumerate(SOURCES)}
+_LABEL_CODES = {label: code for code, label in enumerate(LABELS)}
+
+class ClassifiedItems:
+    """
+    A columnar view of one query's classified items. Source, label and
+    category are encoded once into small integer arrays, so counts,
+    breakdowns and sample selection are array operations instead of repeated
+    scans over the item dicts. Unknown sources or labels, and items whose
+    classification failed, are coded as -1.
+    """
+
+    def __init__(self, items):
+        self.items = items
+        count = len(items)
+        self.categories = []
+        category_codes = {}
+
+        def category_code(item):
+            category = item.get('category') or 'Other'
+            if category not in category_codes:
+                category_codes[category] = len(self.categories)
+                self.categories.append(category)
+            return category_codes[category]
+
+        def label_code(item):
+            if item.get('reason') in UNCLASSIFIED_REASONS:
+                return -1
+            return _LABEL_CODES.get(item.get('sentiment'), -1)
+
+        self.source_codes = np.fromiter((_SOURCE_CODES.get(item.get('source'), -1) for item in items), dtype=np.int8, count=count)
+        self.label_codes = np.fromiter((label_code(item) for item in items), dtype=np.int8, count=count)
+        self.category_codes = np.fromiter((category_code(item) for item in items), dtype=np.int16, count=count)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _label_counts(self, mask=None):
+        codes = self.label_codes if mask is None else self.label_codes[mask]
+        counts = np.bincount(codes[codes >= 0], minlength=len(LABELS))
+        return {label: int(counts[code]) for code, label in enumerate(LABELS)}
+
+    def sentiment_overview(self):
+        """Label counts over the classified items; items that could not be classified are only counted as 'unclassified'."""
+        counts = self._label_counts()
+        unclassified = sum(1 for item in self.items if item.get('reason') in UNCLASSIFIED_REASONS)
+        return {**counts, "total": sum(counts.values()), "unclassified": unclassified}
+
+    def category_breakdown(self):
+        """Label counts per category, e.g. {'Product Quality': {'positive': 3, ...}}."""
+        known = self.label_codes >= 0
+        cells = self.category_codes[known].astype(np.int32) * len(LABELS) + self.label_codes[known]
+        matrix = np.bincount(cells, minlength=len(self.categories) * len(LABELS)).reshape(-1, len(LABELS))
+        return {
+            category: {label: int(matrix[code, label_code]) for label_code, label in enumerate(LABELS)}
+            for code, category in enumerate(self.categories)
+        }
+
+    def source_breakdown(self):
+        """Label counts per source, keyed like the response ('articles', 'twitter_posts', ...)."""
+        known = (self.label_codes >= 0) & (self.source_codes >= 0)
+        cells = self.source_codes[known].astype(np.int32) * len(LABELS) + self.label_codes[known]
+        matrix = np.bincount(cells, minlength=len(SOURCES) * len(LABELS)).reshape(len(SOURCES), len(LABELS))
+        return {
+            SOURCE_KEYS[source]: {label: int(matrix[code, label_code]) for label_code, label in enumerate(LABELS)}
+            for code, source in enumerate(SOURCES)
+        }
+
+    def by_source(self):
+        """Splits the items into the per-source lists of the response, keeping their order."""
+        return {
+            SOURCE_KEYS[source]: [self.items[i] for i in np.flatnonzero(self.source_codes == code)]
+            for code, source in enumerate(SOURCES)
+        }
+
+    def samples(self, label, limit=3):
+        """The first `limit` items carrying `label`."""
+        indexes = np.flatnonzero(self.label_codes == _LABEL_CODES[label])[:limit]
+        return [self.items[i] for i in indexes]
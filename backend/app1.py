@@ -1,102 +1,424 @@
+import json
 import os
-import uuid
-from flask import Flask, request, jsonify, send_from_directory
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from flask import Flask, Response, abort, g, request, jsonify, send_file
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 from fetch_data import fetch_news
 from fetch_social import fetch_twitter_data, fetch_youtube_data
-from summarize import generate_summary
-from sentiment import analyze_sentiment
-from fetch_trends import get_stock_trends
-from report import generate_pdf_report
+from summarize import generate_summary_map_reduce
+from sentiment import classify_sentiment, tier_stats
+from fetch_trends import get_stock_trends_bulk
+from report_store import ReportStore
+from jobs import JobQueue
+from aggregate import UNCLASSIFIED_REASONS, ClassifiedItems
+from scheduler import scheduler_stats, submit_with_context
+from dedup import cluster_near_duplicates
+from prewarm import PREWARM_ENABLED, Prewarmer
+from cache import all_cache_stats
+from metrics import collect_timings, inc, observe, render as render_metrics, span
 
 load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
-if not os.path.exists("reports"):
-    os.makedirs("reports")
+# PDFs are rendered lazily from the stored analysis payload on first download.
+report_store = ReportStore()
 
-def _perform_analysis(queries, is_social_only=False):
-    """A helper function to perform analysis, reducing code duplication."""
-    analysis_results = {}
-    all_content_for_summary = []
+# --- Concurrent fetch stage ---
+# Every (query, source) pair runs on a shared pool, so a compare run costs
+# roughly the slowest single upstream call instead of the sum of all of them.
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "16"))
+SOURCE_TIMEOUTS = {
+    "articles": float(os.getenv("NEWS_FETCH_TIMEOUT", "20")),
+    "stock_trends": float(os.getenv("STOCK_FETCH_TIMEOUT", "15")),
+    "twitter_posts": float(os.getenv("TWITTER_FETCH_TIMEOUT", "20")),
+    "youtube_posts": float(os.getenv("YOUTUBE_FETCH_TIMEOUT", "20")),
+}
+SOURCE_FETCHERS = {
+    "articles": fetch_news,
+    "stock_trends": get_stock_trends_bulk,
+    "twitter_posts": fetch_twitter_data,
+    "youtube_posts": fetch_youtube_data,
+}
+SOCIAL_SOURCES = ("twitter_posts", "youtube_posts")
+# Fetchers that take every query at once and return {query: value}.
+BULK_SOURCES = ("stock_trends",)
+fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
 
-    for query in queries:
-        query = query.strip()
-        if not query: continue
+def _empty_fetch_result(is_social_only):
+    """The value a query gets when none of its sources return anything."""
+    return {"articles": [], "stock_trends": [] if is_social_only else None, "twitter_posts": [], "youtube_posts": []}
 
-        articles = fetch_news(query) if not is_social_only else []
-        stock_trends = get_stock_trends(query) if not is_social_only else []
-        twitter_posts = fetch_twitter_data(query) or []
-        youtube_posts = fetch_youtube_data(query) or []
+def _emit(on_event, event, payload):
+    """Reports pipeline progress to an optional listener without letting it break the analysis."""
+    if on_event is None: return
+    try:
+        on_event(event, payload)
+    except Exception as e:
+        print(f"🟡 Progress listener failed on '{event}': {e}")
 
-        all_sources = articles + twitter_posts + youtube_posts
+def _fetch_all_sources(queries, is_social_only=False, on_event=None):
+    """
+    Fetches every source for every query in parallel. Each source has its own
+    timeout measured from submission; a source that times out or raises is
+    reported and left empty so the rest of the results are still used.
+    """
+    sources = SOCIAL_SOURCES if is_social_only else tuple(SOURCE_FETCHERS)
+    results = {query: _empty_fetch_result(is_social_only) for query in queries}
+    pending = {}
+    for source in sources:
+        if source in BULK_SOURCES:
+            pending[submit_with_context(fetch_executor, SOURCE_FETCHERS[source], list(queries))] = (tuple(queries), source)
+            continue
+        for query in queries:
+            pending[submit_with_context(fetch_executor, SOURCE_FETCHERS[source], query)] = ((query,), source)
 
-        for item in all_sources:
-            raw_sentiment = analyze_sentiment(item.get("description", "") or item.get("text", ""))
+    # Results are collected in completion order so listeners hear about fast
+    # sources first; whatever is still running at its deadline is dropped.
+    started = time.monotonic()
+    while pending:
+        next_deadline = min(SOURCE_TIMEOUTS[source] for _, source in pending.values())
+        done, _ = wait(pending, timeout=max(next_deadline - (time.monotonic() - started), 0), return_when=FIRST_COMPLETED)
+        for future in done:
+            batch, source = pending.pop(future)
+            observe("fetch_source_seconds", time.monotonic() - started, source=source)
             try:
-                lines = raw_sentiment.strip().split('\n')
-                label = next((l.split(":", 1)[1].strip().lower() for l in lines if l.lower().startswith('label:')), 'neutral')
-                # --- NEW: Parse the category ---
-                category = next((l.split(":", 1)[1].strip() for l in lines if l.lower().startswith('category:')), 'Other')
-                reason = next((l.split(":", 1)[1].strip() for l in lines if l.lower().startswith('reason:')), 'N/A')
-                item['sentiment'], item['category'], item['reason'] = label, category, reason
-            except Exception:
-                item['sentiment'], item['category'], item['reason'] = 'neutral', 'Other', 'Parsing failed'
-
-        pos = len([s for s in all_sources if s.get('sentiment') == 'positive'])
-        neg = len([s for s in all_sources if s.get('sentiment') == 'negative'])
-        neu = len([s for s in all_sources if s.get('sentiment') == 'neutral'])
-        total = pos + neg + neu
-
-        sentiment_overview = { "positive": pos, "negative": neg, "neutral": neu, "total": total }
-
-        if total > 0:
-            if pos > neg and pos > neu: sentiment_summary_text = f"Overall sentiment is predominantly positive, based on {total} total mentions."
-            elif neg > pos: sentiment_summary_text = f"Overall sentiment is predominantly negative, based on {total} total mentions."
-            else: sentiment_summary_text = f"Sentiment is mixed across {total} mentions."
-        else:
-            sentiment_summary_text = "No public sentiment data could be found."
-
-        analysis_results[query] = {
-            "sentiment_overview": sentiment_overview,
-            "sentiment_summary_text": sentiment_summary_text,
-            "articles": [i for i in all_sources if i.get('source') == 'newsapi'],
-            "twitter_posts": [i for i in all_sources if i.get('source') == 'Twitter'],
-            "youtube_posts": [i for i in all_sources if i.get('source') == 'YouTube'],
-            "stock_trends": stock_trends
-        }
-        all_content_for_summary.extend(all_sources)
-
-    summary = generate_summary(f"an analysis of {', '.join(queries)}", all_content_for_summary) if all_content_for_summary else "No data available."
-    report_filename, report_url = f"reports/{uuid.uuid4()}.pdf", None
+                value = future.result()
+            except Exception as e:
+                inc("errors_total", stage="fetch", source=source)
+                print(f"🔴 Fetching {source} for '{', '.join(batch)}' failed: {e}")
+                continue
+            for query in batch:
+                query_value = value.get(query) if source in BULK_SOURCES else value
+                if source == "stock_trends":
+                    results[query][source] = query_value
+                    _emit(on_event, "stock_trends", {"query": query, "stock_trends": query_value})
+                else:
+                    results[query][source] = query_value or []
+                    inc("items_fetched_total", len(results[query][source]), source=source)
+                    _emit(on_event, "fetched", {"query": query, "source": source, "items": results[query][source], "count": len(results[query][source])})
+
+        elapsed = time.monotonic() - started
+        for future, (batch, source) in list(pending.items()):
+            if elapsed >= SOURCE_TIMEOUTS[source]:
+                del pending[future]
+                future.cancel()
+                inc("fetch_timeouts_total", source=source)
+                print(f"🟡 Timed out fetching {source} for '{', '.join(batch)}' after {SOURCE_TIMEOUTS[source]:.0f}s, continuing without it.")
+    return results
+
+def _analyze_query(query, fetched, on_event=None):
+    """
+    Classifies one query's fetched items and builds its part of the analysis.
+    Returns (analysis, representatives): the items that stand for each cluster
+    of near-duplicates, which are what gets summarized.
+    """
+    articles = fetched["articles"]
+    stock_trends = fetched["stock_trends"]
+    twitter_posts = fetched["twitter_posts"]
+    youtube_posts = fetched["youtube_posts"]
+
+    all_sources = articles + twitter_posts + youtube_posts
+
+    texts = [item.get("description", "") or item.get("text", "") for item in all_sources]
+    # Retweets and syndicated stories are classified once through their cluster's
+    # representative; every copy gets the same label so the counts stay per item.
+    clusters = cluster_near_duplicates(texts)
+    running_counts = {"positive": 0, "negative": 0, "neutral": 0}
+    unclassified = [0]
+
+    def report_sentiment_progress(indexes, records, query=query, clusters=clusters, running_counts=running_counts, total_items=len(all_sources)):
+        for index, record in zip(indexes, records):
+            if record['reason'] in UNCLASSIFIED_REASONS: unclassified[0] += len(clusters[index])
+            elif record['label'] in running_counts: running_counts[record['label']] += len(clusters[index])
+        labelled = sum(running_counts.values())
+        _emit(on_event, "sentiment_progress", {"query": query, "classified": labelled + unclassified[0], "total_items": total_items,
+                                               "sentiment_overview": {**running_counts, "total": labelled, "unclassified": unclassified[0]}})
+
+    on_progress = report_sentiment_progress if on_event else None
+    results = classify_sentiment([texts[cluster[0]] for cluster in clusters], on_progress=on_progress)
+    for cluster, result in zip(clusters, results):
+        for i in cluster:
+            item = all_sources[i]
+            item['sentiment'], item['category'], item['reason'] = result['label'], result['category'], result['reason']
+        all_sources[cluster[0]]['weight'] = len(cluster)
+
+    # One columnar pass replaces the per-label and per-source list scans.
+    classified = ClassifiedItems(all_sources)
+    sentiment_overview = classified.sentiment_overview()
+    pos, neg, neu, total = (sentiment_overview[k] for k in ("positive", "negative", "neutral", "total"))
+
+    if total > 0:
+        if pos > neg and pos > neu: sentiment_summary_text = f"Overall sentiment is predominantly positive, based on {total} total mentions."
+        elif neg > pos: sentiment_summary_text = f"Overall sentiment is predominantly negative, based on {total} total mentions."
+        else: sentiment_summary_text = f"Sentiment is mixed across {total} mentions."
+    else:
+        sentiment_summary_text = "No public sentiment data could be found."
+    if sentiment_overview["unclassified"]:
+        sentiment_summary_text += f" {sentiment_overview['unclassified']} mentions could not be classified and are not counted."
+
+    analysis = {
+        "sentiment_overview": sentiment_overview,
+        "sentiment_summary_text": sentiment_summary_text,
+        **classified.by_source(),
+        "stock_trends": stock_trends,
+        "category_breakdown": classified.category_breakdown(),
+        "source_breakdown": classified.source_breakdown(),
+    }
+    _emit(on_event, "sentiment", {"query": query, **analysis})
+    return analysis, [all_sources[cluster[0]] for cluster in clusters]
+
+def _perform_analysis(queries, is_social_only=False, on_event=None):
+    """
+    A helper function to perform analysis, reducing code duplication.
+    `on_event(event, payload)` is called as each stage finishes.
+    """
+    analysis_results = {}
+    content_for_summary = {}
+
+    cleaned_queries = [query.strip() for query in queries if query.strip()]
+    with span("fetch"):
+        fetched = _fetch_all_sources(list(dict.fromkeys(cleaned_queries)), is_social_only, on_event)
+
+    for query in cleaned_queries:
+        with span("classify"):
+            analysis_results[query], representatives = _analyze_query(query, fetched[query], on_event)
+        content_for_summary.setdefault(query, []).extend(representatives)
+
+    has_content = any(content_for_summary.values())
+    with span("summarize"):
+        summary = generate_summary_map_reduce(f"an analysis of {', '.join(queries)}", content_for_summary) if has_content else "No data available."
+    _emit(on_event, "summary", {"summary": summary})
+    report_url = None
     if any(analysis_results.values()):
         try:
-            generate_pdf_report(report_filename, queries, summary, analysis_results)
-            report_url = f"/download/{os.path.basename(report_filename)}"
+            with span("report_save"):
+                report_id = report_store.save(queries, summary, analysis_results)
+            report_url = f"/download/{report_id}.pdf"
         except Exception as e:
-            print(f"Error during PDF generation: {e}")
+            print(f"Error while saving the report payload: {e}")
+    _emit(on_event, "report", {"report_url": report_url})
     return summary, analysis_results, report_url
 
+# --- Watchlist pre-warming ---
+def _warm_query(query):
+    """
+    Refreshes one company's fetched data (anything that would go stale before
+    the next cycle), stock history, sentiment labels and partial summary, so
+    the next interactive request for it is served from the caches.
+    """
+    for source, fetcher in SOURCE_FETCHERS.items():
+        if source in BULK_SOURCES:
+            continue
+        expires_in = fetcher.expires_in(query)
+        if expires_in is None or expires_in < prewarmer.interval:
+            fetcher.refresh(query)
+    fetched = _fetch_all_sources([query])
+    _, representatives = _analyze_query(query, fetched[query])
+    if representatives:
+        generate_summary_map_reduce(f"an analysis of {query}", {query: representatives})
+
+prewarmer = Prewarmer(_warm_query)
+if PREWARM_ENABLED:
+    prewarmer.start()
+
+# --- Background analysis jobs ---
+job_queue = JobQueue()
+
+def _job_progress_listener(job):
+    """Turns pipeline events into the progress counters reported by GET /jobs/<id>."""
+    def on_event(event, payload):
+        if event == "fetched":
+            job.increment("sources_fetched")
+            job.increment("items_fetched", payload["count"])
+        elif event == "stock_trends":
+            job.increment("sources_fetched")
+        elif event == "sentiment":
+            job.increment("queries_analyzed")
+            job.increment("items_classified", payload["sentiment_overview"]["total"])
+        job.update_progress(stage=event)
+    return on_event
+
+def _submit_analysis_job(kind, queries, is_social_only, data_key, include_timings=False):
+    def run(job):
+        with collect_timings() as timings:
+            summary, analysis_data, report_url = _perform_analysis(queries, is_social_only, on_event=_job_progress_listener(job))
+        result = {"summary": summary, data_key: analysis_data, "report_url": report_url}
+        if include_timings: result["timings"] = timings.to_dict()
+        return result
+
+    queries_total = len([q for q in queries if q.strip()])
+    sources_per_query = len(SOCIAL_SOURCES) if is_social_only else len(SOURCE_FETCHERS)
+    job = job_queue.submit(kind, run, progress={
+        "stage": "queued", "queries_total": queries_total, "queries_analyzed": 0,
+        "sources_total": queries_total * sources_per_query, "sources_fetched": 0,
+        "items_fetched": 0, "items_classified": 0,
+    })
+    return jsonify({"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}), 202
+
 @app.route("/analyze", methods=["POST"])
 def analyze_companies():
     data = request.get_json(silent=True) or {}; companies = data.get("companies", [])
     if not companies: return jsonify({"error": "Company names are required"}), 400
-    summary, analysis_data, report_url = _perform_analysis(companies, is_social_only=False)
-    return jsonify({"summary": summary, "comparison_data": analysis_data, "report_url": report_url})
+    prewarmer.record_queries(companies)
+    if data.get("async"): return _submit_analysis_job("analyze", companies, False, "comparison_data", data.get("timings"))
+    with collect_timings() as timings:
+        summary, analysis_data, report_url = _perform_analysis(companies, is_social_only=False)
+    result = {"summary": summary, "comparison_data": analysis_data, "report_url": report_url}
+    # "timings": true adds a per-stage breakdown (seconds) to the response.
+    if data.get("timings"): result["timings"] = timings.to_dict()
+    return jsonify(result)
 
 @app.route("/analyze_social", methods=["POST"])
 def analyze_social():
     data = request.get_json(silent=True) or {}; handles = data.get("handles", [])
     if not handles: return jsonify({"error": "Social handles are required"}), 400
-    summary, analysis_data, report_url = _perform_analysis(handles, is_social_only=True)
-    return jsonify({"summary": summary, "analysis_data": analysis_data, "report_url": report_url})
+    if data.get("async"): return _submit_analysis_job("analyze_social", handles, True, "analysis_data", data.get("timings"))
+    with collect_timings() as timings:
+        summary, analysis_data, report_url = _perform_analysis(handles, is_social_only=True)
+    result = {"summary": summary, "analysis_data": analysis_data, "report_url": report_url}
+    if data.get("timings"): result["timings"] = timings.to_dict()
+    return jsonify(result)
+
+# --- Streaming analyses (Server-Sent Events) ---
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def _stream_analysis(queries, is_social_only, data_key, include_timings=False):
+    """
+    Runs the analysis on a background thread and streams every pipeline event
+    as it happens, ending with a 'done' event carrying the full payload (or an
+    'error' event). Events are serialized on the pipeline thread, so later
+    stages can keep mutating the items without racing the response.
+    """
+    events = queue.Queue()
+
+    def run():
+        try:
+            with collect_timings() as timings:
+                summary, analysis_data, report_url = _perform_analysis(
+                    queries, is_social_only, on_event=lambda event, payload: events.put(_sse(event, payload)))
+            result = {"summary": summary, data_key: analysis_data, "report_url": report_url}
+            if include_timings: result["timings"] = timings.to_dict()
+            events.put(_sse("done", result))
+        except Exception as e:
+            print(f"🔴 Streaming analysis failed: {e}")
+            events.put(_sse("error", {"error": str(e)}))
+        finally:
+            events.put(None)
+
+    threading.Thread(target=run, name="analysis-stream", daemon=True).start()
+
+    def generate():
+        while True:
+            try:
+                chunk = events.get(timeout=STREAM_HEARTBEAT)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if chunk is None: return
+            yield chunk
+
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/analyze/stream", methods=["POST"])
+def analyze_companies_stream():
+    data = request.get_json(silent=True) or {}; companies = data.get("companies", [])
+    if not companies: return jsonify({"error": "Company names are required"}), 400
+    prewarmer.record_queries(companies)
+    return _stream_analysis(companies, False, "comparison_data", data.get("timings"))
+
+@app.route("/analyze_social/stream", methods=["POST"])
+def analyze_social_stream():
+    data = request.get_json(silent=True) or {}; handles = data.get("handles", [])
+    if not handles: return jsonify({"error": "Social handles are required"}), 400
+    return _stream_analysis(handles, True, "analysis_data", data.get("timings"))
+
+# --- Metrics ---
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.monotonic()
+
+@app.after_request
+def _record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    started = getattr(g, "request_started", None)
+    if started is not None:
+        # Streaming responses are measured to their first byte.
+        observe("http_request_seconds", time.monotonic() - started, endpoint=endpoint, method=request.method)
+    inc("http_requests_total", endpoint=endpoint, method=request.method, status=response.status_code)
+    if response.content_length is not None:
+        inc("http_response_bytes_total", response.content_length, endpoint=endpoint)
+    return response
+
+def _stat_families():
+    """Counters other modules already keep, in the (name, type, help, samples) form metrics.render takes."""
+    caches = all_cache_stats()
+    providers = scheduler_stats()
+    families = [
+        ("cache_hits_total", "counter", "Cache hits per namespace.", [({"namespace": n}, s["hits"]) for n, s in caches.items()]),
+        ("cache_misses_total", "counter", "Cache misses per namespace.", [({"namespace": n}, s["misses"]) for n, s in caches.items()]),
+        ("cache_memory_entries", "gauge", "Entries held in each in-memory cache tier.", [({"namespace": n}, s["memory_entries"]) for n, s in caches.items()]),
+    ]
+    for name in ("calls", "retries", "throttled", "failures", "wait_seconds"):
+        families.append((f"provider_{name}_total", "counter", f"Outbound provider {name.replace('_', ' ')}.",
+                         [({"provider": p}, s[name]) for p, s in providers.items()]))
+    families.append(("provider_lane_calls_total", "counter", "Outbound provider calls per priority lane.",
+                     [({"provider": p, "lane": lane}, calls) for p, s in providers.items() for lane, calls in s["calls_by_lane"].items()]))
+    sentiment = tier_stats()
+    families.append(("sentiment_items_total", "counter", "Items labelled per sentiment tier.",
+                     [({"tier": "lexicon"}, sentiment.get("lexicon_labelled")), ({"tier": "llm"}, sentiment.get("escalated"))]))
+    for name, value in report_store.stats().items():
+        families.append((f"report_store_{name}", "gauge", f"Report store {name.replace('_', ' ')}.", [({}, value)]))
+    for name, value in prewarmer.to_dict().items():
+        if isinstance(value, (int, float)):
+            families.append((f"prewarm_{name}", "gauge", f"Pre-warmer {name.replace('_', ' ')}.", [({}, value)]))
+    return families
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_metrics(_stat_families()), mimetype="text/plain; version=0.0.4")
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None: return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/sentiment/stats", methods=["GET"])
+def sentiment_stats():
+    return jsonify(tier_stats())
+
+@app.route("/providers/stats", methods=["GET"])
+def provider_stats():
+    return jsonify(scheduler_stats())
+
+@app.route("/prewarm/stats", methods=["GET"])
+def prewarm_stats():
+    return jsonify(prewarmer.to_dict())
+
+@app.route("/reports/stats", methods=["GET"])
+def report_stats():
+    return jsonify(report_store.stats())
 
 @app.route("/download/<path:filename>")
 def download_file(filename):
-    return send_from_directory(os.path.join(os.getcwd(), "reports"), filename, as_attachment=True)
+    report_id = ReportStore.parse_filename(filename)
+    if report_id is None or not report_store.exists(report_id): abort(404)
+    try:
+        with span("render"):
+            pdf_path = report_store.render(report_id)
+    except Exception as e:
+        print(f"Error during PDF generation: {e}")
+        return jsonify({"error": "The report could not be generated"}), 500
+    return send_file(os.path.abspath(pdf_path), as_attachment=True, download_name=f"{report_id}.pdf")
 
 if __name__ == "__main__":
     app.run(debug=True)
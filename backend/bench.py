@@ -0,0 +1,472 @@
+# bench.py
+"""
+Offline benchmark for the analysis pipeline. NewsAPI, Twitter, YouTube,
+yfinance and Gemini are replaced by local stand-ins that serve the fixtures
+in data/bench_fixtures.json with configurable latency and injected
+failures, so no network or API keys are needed.
+
+    python bench.py analyze --requests 40 --concurrency 4
+    python bench.py http --requests 20 --concurrency 8 --failure-rate 0.05
+    python bench.py all --cold --unthrottled --json results.json
+
+Scenarios: `analyze` calls _perform_analysis directly, `pdf` renders
+reports with generate_pdf_report, and `http` posts to /analyze and downloads
+the report through the Flask app. Every run uses a scratch directory for the
+caches, stock store and reports.
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bench_fixtures.json")
+# Typical response times in seconds; each call sleeps between 0.5x and 1.5x of these.
+DEFAULT_LATENCY = {"gemini": 0.6, "newsapi": 0.3, "twitter": 0.25, "youtube": 0.2, "yfinance": 0.4}
+PROVIDERS = tuple(DEFAULT_LATENCY)
+SCENARIOS = ("analyze", "pdf", "http")
+
+def _isolate(workdir, unthrottled):
+    """Points every store at the scratch directory and sets fake credentials. Must run before the backend is imported."""
+    os.environ.update({
+        "NEWS_API_KEY": "bench", "TWITTER_BEARER_TOKEN": "bench", "YOUTUBE_API_KEY": "bench", "GEMINI_API_KEY": "bench",
+        "CACHE_DB_PATH": os.path.join(workdir, "cache.sqlite3"),
+        "STOCK_DB_PATH": os.path.join(workdir, "stocks.sqlite3"),
+        "REPORTS_DIR": os.path.join(workdir, "reports"),
+        "PREWARM_ENABLED": "0",
+    })
+    if unthrottled:
+        # Lifts the per-provider rate limits so the run measures the pipeline rather than the quotas.
+        for provider in PROVIDERS:
+            os.environ[f"{provider.upper()}_RATE_PER_SEC"] = "10000"
+            os.environ[f"{provider.upper()}_BURST"] = "10000"
+            os.environ[f"{provider.upper()}_MAX_CONCURRENCY"] = "256"
+
+def _stable_id(text):
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:12], 16)
+
+# --- Latency and failure injection ---
+
+class InjectedError(Exception):
+    """A simulated upstream failure. The status code makes the scheduler retry it like a real 429/503."""
+
+    def __init__(self, provider, status_code):
+        super().__init__(f"injected {status_code} from {provider}")
+        self.status_code = status_code
+
+class Upstream:
+    """Counts every stand-in call and applies the configured latency and failure rate."""
+
+    def __init__(self, latency, failure_rate, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = {provider: 0 for provider in PROVIDERS}
+        self.failures = {provider: 0 for provider in PROVIDERS}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(self, provider):
+        with self._lock:
+            self.calls[provider] += 1
+            delay = self.latency.get(provider, 0.0) * self._random.uniform(0.5, 1.5)
+            failed = self._random.random() < self.failure_rate
+            status = self._random.choice((429, 503))
+            if failed:
+                self.failures[provider] += 1
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise InjectedError(provider, status)
+
+    def counts(self):
+        with self._lock:
+            return dict(self.calls), dict(self.failures)
+
+# --- Fixtures ---
+
+class Fixtures:
+    """Expands the fixture templates into `items` deterministic items per source for any query."""
+
+    def __init__(self, path, items):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.companies = data["companies"]
+        self.regions = data["regions"]
+        self.templates = data
+        self.items = items
+
+    def _fill(self, template, query, n):
+        return template.format(company=query.title(), n=n, region=self.regions[n % len(self.regions)])
+
+    def news(self, query):
+        """Newest first, one article per hour."""
+        now = datetime.datetime(2024, 6, 1, 12, 0, 0)
+        articles = []
+        for n in range(self.items):
+            template = self.templates["news"][n % len(self.templates["news"])]
+            published = now - datetime.timedelta(hours=n)
+            articles.append({
+                "title": self._fill(template["title"], query, n),
+                "description": self._fill(template["description"], query, n),
+                "url": f"https://news.example.com/{_stable_id(query)}/{n}",
+                "publishedAt": published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            })
+        return articles
+
+    def tweets(self, query):
+        """Newest (highest id) first."""
+        base = _stable_id(query) * 1000
+        return [
+            types.SimpleNamespace(id=base + self.items - n, text=self._fill(self.templates["tweets"][n % len(self.templates["tweets"])], query, n))
+            for n in range(self.items)
+        ]
+
+    def videos(self, query):
+        now = datetime.datetime(2024, 6, 1, 12, 0, 0)
+        videos = []
+        for n in range(self.items):
+            template = self.templates["videos"][n % len(self.templates["videos"])]
+            videos.append({"snippet": {
+                "title": self._fill(template["title"], query, n),
+                "description": self._fill(template["description"], query, n),
+                "publishedAt": (now - datetime.timedelta(days=n)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "resourceId": {"videoId": f"{_stable_id(query)}-{n}"},
+            }})
+        return videos
+
+    def summary(self, company):
+        return self.templates["summary"].format(company=company)
+
+# --- Stand-in clients ---
+
+class FakeNewsApi:
+    def __init__(self, upstream, fixtures):
+        self.upstream, self.fixtures = upstream, fixtures
+
+    def get_everything(self, q=None, from_param=None, page_size=100, page=1, **kwargs):
+        self.upstream.call("newsapi")
+        articles = self.fixtures.news(q)
+        if from_param:
+            articles = [article for article in articles if article["publishedAt"][:19] >= from_param]
+        start = (page - 1) * page_size
+        return {"status": "ok", "totalResults": len(articles), "articles": articles[start:start + page_size]}
+
+class FakeTwitter:
+    def __init__(self, upstream, fixtures):
+        self.upstream, self.fixtures = upstream, fixtures
+        self._usernames = {}
+
+    def get_user(self, username):
+        self.upstream.call("twitter")
+        user_id = _stable_id(username)
+        self._usernames[user_id] = username
+        return types.SimpleNamespace(data=types.SimpleNamespace(id=user_id))
+
+    def get_users_tweets(self, id, **params):
+        return self._page(self._usernames.get(int(id), str(id)), params, "pagination_token")
+
+    def search_recent_tweets(self, query, **params):
+        return self._page(query, params, "next_token")
+
+    def _page(self, query, params, token_param):
+        self.upstream.call("twitter")
+        tweets = self.fixtures.tweets(query)
+        if params.get("since_id"):
+            tweets = [tweet for tweet in tweets if tweet.id > int(params["since_id"])]
+        start, size = int(params.get(token_param) or 0), params.get("max_results", 10)
+        page = tweets[start:start + size]
+        meta = {"result_count": len(page)}
+        if tweets:
+            meta["newest_id"] = str(tweets[0].id)
+        if start + size < len(tweets):
+            meta["next_token"] = str(start + size)
+        return types.SimpleNamespace(data=page or None, meta=meta)
+
+class _Request:
+    """Mimics a googleapiclient request: nothing happens until execute()."""
+
+    def __init__(self, upstream, respond):
+        self.upstream, self.respond = upstream, respond
+
+    def execute(self):
+        self.upstream.call("youtube")
+        return self.respond()
+
+class FakeYouTube:
+    def __init__(self, upstream, fixtures):
+        self.upstream, self.fixtures = upstream, fixtures
+
+    def _resource(self, respond):
+        return types.SimpleNamespace(list=lambda **params: _Request(self.upstream, lambda: respond(**params)))
+
+    def search(self):
+        return self._resource(lambda q, **params: {"items": [{"id": {"channelId": f"UC-{q}"}}]})
+
+    def channels(self):
+        return self._resource(lambda id, **params: {"items": [{"contentDetails": {"relatedPlaylists": {"uploads": f"UU-{id[3:]}"}}}]})
+
+    def playlistItems(self):
+        def respond(playlistId, maxResults=5, pageToken=None, **params):
+            videos = self.fixtures.videos(playlistId[3:])
+            start = int(pageToken or 0)
+            response = {"items": videos[start:start + maxResults]}
+            if start + maxResults < len(videos):
+                response["nextPageToken"] = str(start + maxResults)
+            return response
+        return self._resource(respond)
+
+_SNIPPET = re.compile(r'^\[(\d+)\] "(.*)"\s*$', re.MULTILINE)
+_SINGLE_TEXT = re.compile(r'^\s*Text: "(.*)"\s*$', re.MULTILINE)
+_NEGATIVE_WORDS = ("lawsuit", "slump", "fell", "complain", "worst", "terrible", "delay", "recall", "criticism", "confusing", "not worth", "problems", "cut")
+_POSITIVE_WORDS = ("record", "beat", "love", "great", "amazing", "impressed", "award", "solid", "praised", "expands")
+_CATEGORY_WORDS = (
+    ("Customer Service", ("support", "service")), ("Price & Value", ("price", "worth", "cost")),
+    ("Delivery & Shipping", ("delivery", "order")), ("Website & App Experience", ("app", "update")),
+    ("Company News & Financials", ("revenue", "shares", "stock", "earnings", "guidance", "cfo")),
+    ("Product Quality", ("product", "quality", "recall", "review")),
+)
+
+def _label(text):
+    lowered = text.lower()
+    label = "negative" if any(w in lowered for w in _NEGATIVE_WORDS) else "positive" if any(w in lowered for w in _POSITIVE_WORDS) else "neutral"
+    category = next((name for name, words in _CATEGORY_WORDS if any(w in lowered for w in words)), "Other")
+    return f"Label: {label}\nCategory: {category}\nReason: keyword match"
+
+class FakeGemini:
+    """Answers batched and single sentiment prompts with keyword labels, and anything else with a fixed summary."""
+
+    def __init__(self, upstream, fixtures):
+        self.upstream, self.fixtures = upstream, fixtures
+
+    def generate_content(self, prompt, **kwargs):
+        self.upstream.call("gemini")
+        snippets = _SNIPPET.findall(prompt)
+        if snippets:
+            text = "\n".join(f"[{number}]\n{_label(snippet)}" for number, snippet in snippets)
+        elif "Now, analyze this text" in prompt:
+            text = _label(_SINGLE_TEXT.findall(prompt)[-1])
+        else:
+            text = self.fixtures.summary("the companies covered")
+        return types.SimpleNamespace(text=text)
+
+def fake_price_source(upstream):
+    """Deterministic random-walk daily closes, fetched through the scheduler like yfinance_source."""
+    from scheduler import call_provider
+
+    def source(tickers, start):
+        call_provider("yfinance", upstream.call, "yfinance")
+        bars = {}
+        for ticker in tickers:
+            rng = random.Random(ticker)
+            price, day, dates, closes = rng.uniform(50, 500), start, [], []
+            while day <= datetime.date.today():
+                if day.weekday() < 5:
+                    price *= 1 + rng.gauss(0, 0.015)
+                    dates.append(day.isoformat())
+                    closes.append(round(price, 2))
+                day += datetime.timedelta(days=1)
+            bars[ticker] = (dates, closes)
+        return bars
+    return source
+
+def install(upstream, fixtures):
+    """Swaps every provider client and the price source for the stand-ins."""
+    import clients
+    import sentiment
+    import stock_store
+    import summarize
+
+    clients.override_client("newsapi", FakeNewsApi(upstream, fixtures))
+    clients.override_client("twitter", FakeTwitter(upstream, fixtures))
+    clients.override_client("youtube", FakeYouTube(upstream, fixtures))
+    model = FakeGemini(upstream, fixtures)
+    clients.override_client(f"gemini:{sentiment.MODEL_NAME}", model)
+    clients.override_client(f"gemini:{summarize.MODEL_NAME}", model)
+    stock_store.set_price_source(fake_price_source(upstream))
+
+# --- Scenarios ---
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+class Bench:
+    def __init__(self, args, upstream, fixtures):
+        self.args = args
+        self.upstream = upstream
+        self.fixtures = fixtures
+        self._pdf_input = None
+
+        import app1
+        from report import generate_pdf_report
+        self.app1 = app1
+        self.generate_pdf_report = generate_pdf_report
+        if args.cold:
+            self.register_cold_listings()
+
+    def register_cold_listings(self):
+        """
+        Lists every generated cold name ("tesla 3") under a ticker of its own,
+        so cold requests resolve and also start from an empty stock store.
+        """
+        from fetch_trends import COMPANY_TICKER_MAP, resolve_ticker
+        from ticker_index import get_index
+
+        index = get_index(COMPANY_TICKER_MAP)
+        for company in self.fixtures.companies:
+            base = resolve_ticker(company) or company.upper()
+            for i in range(self.args.requests):
+                index.add(f"{base}-C{i}", names=[f"{company} {i}"])
+        index.freeze()
+
+    def queries(self, i):
+        """Request i asks for `--companies` names; with --cold every request gets names nothing has cached."""
+        names = self.fixtures.companies
+        queries = [names[(i * self.args.companies + k) % len(names)] for k in range(self.args.companies)]
+        return [f"{query} {i}" for query in queries] if self.args.cold else queries
+
+    def analyze(self, i):
+        self.app1._perform_analysis(self.queries(i))
+
+    def prepare_pdf(self):
+        """Runs the one analysis the pdf scenario renders, outside the measured requests."""
+        queries = self.queries(0)
+        summary, data, _ = self.app1._perform_analysis(queries)
+        self._pdf_input = (queries, summary, data)
+        os.makedirs(os.path.join(self.args.workdir, "bench-pdf"), exist_ok=True)
+
+    def pdf(self, i):
+        queries, summary, data = self._pdf_input
+        self.generate_pdf_report(os.path.join(self.args.workdir, "bench-pdf", f"{i}.pdf"), queries, summary, data)
+
+    def http(self, i):
+        client = self.app1.app.test_client()
+        response = client.post("/analyze", json={"companies": self.queries(i)})
+        if response.status_code != 200:
+            raise RuntimeError(f"/analyze returned {response.status_code}")
+        report_url = response.get_json().get("report_url")
+        if report_url:
+            download = client.get(report_url)
+            if download.status_code != 200:
+                raise RuntimeError(f"{report_url} returned {download.status_code}")
+
+    def run(self, scenario):
+        import metrics
+        from scheduler import scheduler_stats
+
+        fn = getattr(self, scenario)
+        if scenario == "pdf" and self._pdf_input is None:
+            self.prepare_pdf()
+        if not self.args.cold:
+            # Unmeasured pass over every distinct query set, so the measured run sees warm caches.
+            for i in range(max(len(self.fixtures.companies) // self.args.companies, 1)):
+                fn(i)
+        metrics.reset()
+        calls_before, failures_before = self.upstream.counts()
+        retries_before = {p: s["retries"] for p, s in scheduler_stats().items()}
+
+        def timed(i):
+            started = time.perf_counter()
+            try:
+                fn(i)
+                return time.perf_counter() - started, None
+            except Exception as e:
+                return time.perf_counter() - started, str(e)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as executor:
+            outcomes = list(executor.map(timed, range(self.args.requests)))
+        wall = time.perf_counter() - started
+
+        calls, failures = self.upstream.counts()
+        latencies = [seconds for seconds, error in outcomes if error is None]
+        errors = [error for _, error in outcomes if error is not None]
+        stages = metrics.snapshot()["summaries"].get("stage_seconds", {})
+        return {
+            "scenario": scenario,
+            "requests": self.args.requests,
+            "concurrency": self.args.concurrency,
+            "errors": len(errors),
+            "first_error": errors[0] if errors else None,
+            "wall_seconds": round(wall, 3),
+            "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+            "latency_ms": {name: round(_percentile(latencies, q) * 1000, 1) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))},
+            "upstream_calls": {p: calls[p] - calls_before[p] for p in PROVIDERS},
+            "injected_failures": {p: failures[p] - failures_before[p] for p in PROVIDERS},
+            "retries": {p: s["retries"] - retries_before.get(p, 0) for p, s in scheduler_stats().items()},
+            "stages_ms": {key.split("=", 1)[1]: {"p50": round(s["p50"] * 1000, 1), "p95": round(s["p95"] * 1000, 1), "count": s["count"]}
+                          for key, s in stages.items()},
+        }
+
+def _print_result(result):
+    print(f"\n{result['scenario']}: {result['requests']} requests at concurrency {result['concurrency']}, {result['errors']} errors")
+    if result["first_error"]:
+        print(f"  first error: {result['first_error']}")
+    print(f"  throughput  {result['throughput_rps']} req/s over {result['wall_seconds']}s")
+    print("  latency ms  " + "  ".join(f"{name} {value}" for name, value in result["latency_ms"].items()))
+    print("  upstream    " + "  ".join(f"{p}={n}" for p, n in result["upstream_calls"].items()))
+    if any(result["injected_failures"].values()):
+        print("  injected    " + "  ".join(f"{p}={n}" for p, n in result["injected_failures"].items() if n)
+              + "   retries " + "  ".join(f"{p}={n}" for p, n in result["retries"].items() if n))
+    for stage, s in result["stages_ms"].items():
+        print(f"  stage {stage:<12} p50 {s['p50']:>8} ms   p95 {s['p95']:>8} ms   ({s['count']})")
+
+def _parse_latency(value, scale):
+    latency = dict(DEFAULT_LATENCY)
+    for part in filter(None, (value or "").split(",")):
+        provider, seconds = part.split("=")
+        latency[provider.strip()] = float(seconds)
+    return {provider: seconds * scale for provider, seconds in latency.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the analysis pipeline with stand-in providers.")
+    parser.add_argument("scenario", choices=SCENARIOS + ("all",))
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--companies", type=int, default=1, help="companies per request (2+ is a compare run)")
+    parser.add_argument("--items", type=int, default=40, help="items each stand-in returns per source and query")
+    parser.add_argument("--latency", help="per-provider seconds, e.g. gemini=0.8,newsapi=0.2")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplies every latency; 0 measures CPU time only")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability that any upstream call fails with a 429/503")
+    parser.add_argument("--cold", action="store_true", help="give every request uncached queries instead of warming up first")
+    parser.add_argument("--unthrottled", action="store_true", help="lift the per-provider rate limits")
+    parser.add_argument("--fixtures", default=BENCH_FIXTURES)
+    parser.add_argument("--workdir", help="scratch directory (default: a temporary one, removed afterwards)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    keep_workdir = bool(args.workdir)
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="bench-")
+    _isolate(args.workdir, args.unthrottled)
+    upstream = Upstream(_parse_latency(args.latency, args.latency_scale), args.failure_rate, args.seed)
+    fixtures = Fixtures(args.fixtures, args.items)
+    install(upstream, fixtures)
+    bench = Bench(args, upstream, fixtures)
+
+    try:
+        results = []
+        for scenario in SCENARIOS if args.scenario == "all" else (args.scenario,):
+            result = bench.run(scenario)
+            _print_result(result)
+            results.append(result)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"settings": {k: v for k, v in vars(args).items() if k != "json"}, "results": results}, f, indent=2)
+    finally:
+        if not keep_workdir:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
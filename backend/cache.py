@@ -0,0 +1,198 @@
+# cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", os.path.join("cache", "cache.sqlite3"))
+
+# Every cache created in this process, so their counters can be reported together.
+_caches = []
+
+def make_key(*parts):
+    """Builds a stable content-addressed key from any number of string parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+class TieredCache:
+    """
+    A two-tier key/value cache for JSON-serialisable values.
+
+    The first tier is an in-process LRU dict; the second is a sqlite table
+    shared by every worker process on the host. Entries older than `ttl`
+    seconds are treated as missing, and each tier is capped at its own number
+    of entries (least recently used entries are evicted first).
+    """
+
+    def __init__(self, namespace, ttl, max_memory_entries=1000, max_disk_entries=100000, db_path=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.db_path = db_path or CACHE_DB_PATH
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes_since_evict = 0
+        _caches.append(self)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (namespace, accessed_at)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, value, stored_at):
+        with self._lock:
+            self._memory[key] = (value, stored_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_entry(self, key, max_age=None):
+        """
+        Returns `(value, stored_at)` for a key no older than `max_age` seconds
+        (defaults to the cache TTL), or None.
+        """
+        max_age = self.ttl if max_age is None else max_age
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] <= max_age:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return entry
+
+        entry = None
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, stored_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is not None and now - row[1] <= max_age:
+                entry = (json.loads(row[0]), row[1])
+                conn.execute(
+                    "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, self.namespace, key),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"🟡 Cache '{self.namespace}' could not read from disk: {e}")
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+        self._remember(key, *entry)
+        return entry
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def set(self, key, value):
+        now = time.time()
+        self._remember(key, value, now)
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), now, now),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"🟡 Cache '{self.namespace}' could not write to disk: {e}")
+            return
+
+        with self._lock:
+            self._writes_since_evict += 1
+            should_evict = self._writes_since_evict >= 100
+            if should_evict:
+                self._writes_since_evict = 0
+        if should_evict:
+            self.evict()
+
+    def delete(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            conn = self._connection()
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"🟡 Cache '{self.namespace}' could not delete from disk: {e}")
+
+    def evict(self):
+        """Drops expired disk entries, then the least recently used ones above the size cap."""
+        try:
+            conn = self._connection()
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND stored_at < ?",
+                (self.namespace, time.time() - self.ttl),
+            )
+            conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                "SELECT key FROM cache_entries WHERE namespace = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.namespace, self.namespace, self.max_disk_entries),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"🟡 Cache '{self.namespace}' eviction failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self.hits = self.misses = self.memory_hits = self.disk_hits = 0
+        try:
+            conn = self._connection()
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"🟡 Cache '{self.namespace}' could not be cleared: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+def all_cache_stats():
+    """Counters for every cache created in this process, keyed by namespace."""
+    return {cache.namespace: cache.stats() for cache in _caches}
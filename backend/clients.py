@@ -0,0 +1,91 @@
+# clients.py
+
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+
+# Clients shared by every thread, keyed by (name, credential).
+_shared = {}
+_lock = threading.Lock()
+# Clients that are not thread-safe get one instance per thread instead.
+_per_thread = threading.local()
+_generation = 0
+# Instances installed by tests or benchmarks in place of the real clients.
+_overrides = {}
+
+def pooled_session():
+    """A requests session that keeps up to HTTP_POOL_SIZE connections alive per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def _get_shared(name, credential, factory):
+    if name in _overrides:
+        return _overrides[name]
+    key = (name, credential)
+    client = _shared.get(key)
+    if client is None:
+        with _lock:
+            client = _shared.get(key)
+            if client is None:
+                client = _shared[key] = factory()
+    return client
+
+def _get_per_thread(name, credential, factory):
+    if name in _overrides:
+        return _overrides[name]
+    if getattr(_per_thread, "generation", None) != _generation:
+        _per_thread.clients = {}
+        _per_thread.generation = _generation
+    key = (name, credential)
+    client = _per_thread.clients.get(key)
+    if client is None:
+        client = _per_thread.clients[key] = factory()
+    return client
+
+def get_newsapi_client(api_key):
+    from newsapi import NewsApiClient
+    return _get_shared("newsapi", api_key, lambda: NewsApiClient(api_key=api_key, session=pooled_session()))
+
+def get_twitter_client(bearer_token):
+    import tweepy
+
+    def build_client():
+        client = tweepy.Client(bearer_token=bearer_token)
+        client.session = pooled_session()
+        return client
+    return _get_shared("twitter", bearer_token, build_client)
+
+def get_youtube_client(api_key):
+    # googleapiclient's httplib2 transport is not thread-safe, so each thread
+    # builds its own service once (from the bundled discovery document) and reuses it.
+    from googleapiclient.discovery import build
+    return _get_per_thread("youtube", api_key, lambda: build('youtube', 'v3', developerKey=api_key, cache_discovery=False))
+
+def get_gemini_model(model_name):
+    import google.generativeai as genai
+    return _get_shared(f"gemini:{model_name}", None, lambda: genai.GenerativeModel(model_name))
+
+def override_client(name, client):
+    """Makes every getter for `name` ('newsapi', 'twitter', 'youtube', 'gemini:<model>') return `client`."""
+    with _lock:
+        _overrides[name] = client
+
+def reset_clients():
+    """Drops every cached client and override; the next call to a getter builds a fresh one."""
+    global _generation
+    with _lock:
+        for client in _shared.values():
+            session = getattr(client, "session", None) or getattr(client, "request_method", None)
+            if isinstance(session, requests.Session):
+                session.close()
+        _shared.clear()
+        _overrides.clear()
+        _generation += 1
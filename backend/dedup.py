@@ -0,0 +1,90 @@
+# dedup.py
+
+import os
+import re
+import zlib
+from collections import defaultdict
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+# Estimated Jaccard similarity above which two snippets are treated as copies of each other.
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+
+_NUM_PERMUTATIONS = 64
+_BANDS, _ROWS = 16, 4  # 16 bands x 4 rows; catches pairs with similarity around 0.5 and above
+_SHINGLE_SIZE = 3
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, _PRIME, size=_NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, size=_NUM_PERMUTATIONS, dtype=np.uint64)
+
+_RETWEET = re.compile(r"^rt\s+@\w+:?\s*")
+_URL = re.compile(r"https?://\S+")
+_MENTION = re.compile(r"[@#]\w+")
+_NON_WORD = re.compile(r"[^\w\s]")
+
+def normalize(text):
+    """Lowercases and strips retweet prefixes, links, mentions, hashtags and punctuation."""
+    text = _RETWEET.sub("", (text or "").lower().strip())
+    text = _URL.sub(" ", text)
+    text = _MENTION.sub(" ", text)
+    text = _NON_WORD.sub(" ", text)
+    return " ".join(text.split())
+
+def _signature(words):
+    shingles = {" ".join(words[i:i + _SHINGLE_SIZE]) for i in range(max(len(words) - _SHINGLE_SIZE + 1, 1))}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def cluster_near_duplicates(texts, threshold=None):
+    """
+    Groups identical and near-identical snippets. Exact matches after
+    normalization are merged first; the remaining distinct texts are compared
+    with MinHash signatures over word shingles, using LSH banding to find
+    candidate pairs. Returns a list of clusters (lists of indexes into
+    `texts`, in input order); each cluster's first index is its representative.
+    Empty snippets are kept as singletons.
+    """
+    threshold = DEDUP_THRESHOLD if threshold is None else threshold
+    parent = list(range(len(texts)))
+    if not DEDUP_ENABLED:
+        return [[i] for i in parent]
+
+    by_text = {}
+    for i, text in enumerate(texts):
+        normalized = normalize(text) if isinstance(text, str) else ""
+        if not normalized:
+            continue
+        if normalized in by_text:
+            parent[i] = by_text[normalized][0]
+        else:
+            by_text[normalized] = (i, normalized.split())
+
+    distinct = [(i, words) for i, words in by_text.values() if len(words) >= _SHINGLE_SIZE]
+    if len(distinct) > 1:
+        signatures = np.stack([_signature(words) for _, words in distinct])
+        buckets = defaultdict(list)
+        for band in range(_BANDS):
+            rows = signatures[:, band * _ROWS:(band + 1) * _ROWS]
+            for position, row in enumerate(rows):
+                buckets[(band, row.tobytes())].append(position)
+        for members in buckets.values():
+            for other in members[1:]:
+                first = members[0]
+                if np.mean(signatures[first] == signatures[other]) >= threshold:
+                    root_a, root_b = _find(parent, distinct[first][0]), _find(parent, distinct[other][0])
+                    if root_a != root_b:
+                        parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters = defaultdict(list)
+    for i in range(len(texts)):
+        clusters[_find(parent, i)].append(i)
+    return sorted(clusters.values(), key=lambda cluster: cluster[0])
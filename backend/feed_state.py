@@ -0,0 +1,71 @@
+# feed_state.py
+
+import copy
+import os
+import time
+from dotenv import load_dotenv
+
+from cache import TieredCache, make_key
+
+load_dotenv()
+# How long a query's cursor and item window are kept after its last fetch.
+# Every fetch re-saves the state, so callers whose cursor expires upstream
+# check its age with cursor_age() instead of relying on this.
+FEED_STATE_TTL = float(os.getenv("FEED_STATE_TTL", str(3 * 24 * 3600)))
+
+class FeedState:
+    """
+    Per-query incremental fetch state for one source: the newest cursor seen
+    upstream (tweet id, publish time, ...), any lookups worth remembering
+    (user or channel ids) and a bounded window of the newest items. Each run
+    only asks upstream for items after the cursor and merges them in.
+    """
+
+    def __init__(self, source, max_items):
+        self.source = source
+        self.max_items = max_items
+        self.cache = TieredCache(
+            f"feed:{source}",
+            ttl=FEED_STATE_TTL,
+            max_memory_entries=int(os.getenv("FEED_STATE_MEMORY_ENTRIES", "500")),
+            max_disk_entries=int(os.getenv("FEED_STATE_MAX_ENTRIES", "20000")),
+        )
+
+    def _key(self, query):
+        return make_key(self.source, (query or "").strip().lower())
+
+    def load(self, query):
+        """Returns the stored state dict ({"cursor", "cursor_at", "items", "meta"}); empty for a new query."""
+        state = self.cache.get(self._key(query))
+        return {"cursor": None, "cursor_at": None, "items": [], "meta": {}, **(state or {})}
+
+    @staticmethod
+    def cursor_age(state):
+        """Seconds since the item the cursor points at was published, or None if unknown."""
+        return None if state.get("cursor_at") is None else time.time() - state["cursor_at"]
+
+    def merge(self, query, state, new_items, cursor=None, meta=None, cursor_at=None):
+        """
+        Puts `new_items` (newest first) ahead of the stored window, drops
+        repeats by URL (items without one are kept), trims to max_items and
+        saves it with the new cursor and its publish time (`cursor_at`, a
+        unix timestamp). Returns the merged items.
+        """
+        merged, seen = [], set()
+        for item in list(new_items) + state["items"]:
+            url = item.get("url")
+            if url:
+                if url in seen:
+                    continue
+                seen.add(url)
+            merged.append(item)
+            if len(merged) >= self.max_items:
+                break
+        updated = {
+            "cursor": cursor if cursor is not None else state["cursor"],
+            "cursor_at": cursor_at if cursor is not None else state["cursor_at"],
+            "items": merged,
+            "meta": {**state["meta"], **(meta or {})},
+        }
+        self.cache.set(self._key(query), updated)
+        return copy.deepcopy(merged)
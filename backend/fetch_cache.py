@@ -0,0 +1,119 @@
+# fetch_cache.py
+
+import copy
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from cache import TieredCache, make_key
+from scheduler import BACKGROUND, request_priority
+
+load_dotenv()
+# How long past its TTL a response may still be served while it is refreshed in the background.
+FETCH_CACHE_MAX_STALE = float(os.getenv("FETCH_CACHE_MAX_STALE", str(24 * 3600)))
+
+refresh_executor = ThreadPoolExecutor(max_workers=int(os.getenv("FETCH_REFRESH_WORKERS", "4")), thread_name_prefix="fetch-refresh")
+
+class _Flight:
+    """One in-progress upstream call that concurrent identical requests wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+def _single_flight(key, load):
+    """Runs `load` once for all threads asking for the same key at the same time."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if leader:
+        try:
+            flight.value = load()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with _flights_lock:
+                _flights.pop(key, None)
+            flight.done.set()
+    else:
+        flight.done.wait()
+
+    if flight.error is not None:
+        raise flight.error
+    return flight.value
+
+def cached_fetch(source, ttl):
+    """
+    Decorates an upstream fetcher taking a query string with a shared response
+    cache. Fresh responses (younger than `ttl` seconds) are returned directly;
+    stale ones are returned immediately while a single background refresh runs;
+    identical concurrent misses are coalesced into one upstream call. Empty
+    responses are not cached, since fetchers return them on errors too.
+    """
+    cache = TieredCache(
+        f"fetch:{source}",
+        ttl=ttl + FETCH_CACHE_MAX_STALE,
+        max_memory_entries=int(os.getenv("FETCH_CACHE_MEMORY_ENTRIES", "500")),
+        max_disk_entries=int(os.getenv("FETCH_CACHE_MAX_ENTRIES", "20000")),
+    )
+
+    def decorator(fetcher):
+        def load(key, query, args, kwargs):
+            value = fetcher(query, *args, **kwargs)
+            if value:
+                cache.set(key, value)
+            return value
+
+        def refresh_in_background(key, query, args, kwargs):
+            def run():
+                try:
+                    with request_priority(BACKGROUND):
+                        _single_flight(key, lambda: load(key, query, args, kwargs))
+                except Exception as e:
+                    print(f"🟡 Background refresh of {source} for '{query}' failed: {e}")
+            with _flights_lock:
+                if key in _flights:
+                    return
+            refresh_executor.submit(run)
+
+        def cache_key(query, args, kwargs):
+            return make_key(source, (query or "").strip().lower(), repr(args), repr(sorted(kwargs.items())))
+
+        @functools.wraps(fetcher)
+        def wrapper(query, *args, **kwargs):
+            key = cache_key(query, args, kwargs)
+            entry = cache.get_entry(key)
+            if entry is not None:
+                value, stored_at = entry
+                if time.time() - stored_at > ttl:
+                    refresh_in_background(key, query, args, kwargs)
+                return copy.deepcopy(value)
+            return copy.deepcopy(_single_flight(key, lambda: load(key, query, args, kwargs)))
+
+        def refresh(query, *args, **kwargs):
+            """Bypasses the cache, fetches from upstream and stores the result."""
+            key = cache_key(query, args, kwargs)
+            return copy.deepcopy(_single_flight(key, lambda: load(key, query, args, kwargs)))
+
+        def expires_in(query, *args, **kwargs):
+            """Seconds until the cached response goes stale (negative once it has), or None if nothing is cached."""
+            entry = cache.get_entry(cache_key(query, args, kwargs))
+            return None if entry is None else ttl - (time.time() - entry[1])
+
+        wrapper.refresh = refresh
+        wrapper.expires_in = expires_in
+        wrapper.cache = cache
+        wrapper.uncached = fetcher
+        return wrapper
+
+    return decorator
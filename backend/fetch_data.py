@@ -1,14 +1,28 @@
 import os
-from newsapi import NewsApiClient
 from dotenv import load_dotenv
 
+from clients import get_newsapi_client
+from feed_state import FeedState
+from fetch_cache import cached_fetch
+from scheduler import call_provider
+
 # Load environment variables from the .env file
 load_dotenv()
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
+NEWS_PAGE_SIZE = 100
+# Pages fetched per run; raise it for deeper history on a query's first fetch.
+NEWS_MAX_PAGES = int(os.getenv("NEWS_MAX_PAGES", "1"))
+
+news_state = FeedState("newsapi", max_items=NEWS_PAGE_SIZE * NEWS_MAX_PAGES)
 
+@cached_fetch("newsapi", ttl=float(os.getenv("NEWS_CACHE_TTL", "900")))
 def fetch_news(company_name):
     """
     Fetches news articles for a given company name using the News API.
+    After the first run only articles newer than the last one seen are
+    requested and merged into the stored window for the query. A delta
+    larger than NEWS_MAX_PAGES pages is cut to its newest articles, leaving a
+    gap before them that is never fetched.
     Includes robust error checking and clear debugging output.
     """
     # 1. Check for the API Key
@@ -18,27 +32,42 @@ def fetch_news(company_name):
 
     print(f"🔍 Fetching news for: {company_name}")
     try:
-        # 2. Initialize the News API Client
-        newsapi = NewsApiClient(api_key=NEWS_API_KEY)
-
-        # 3. Make the request to the 'everything' endpoint
-        response = newsapi.get_everything(
-            q=company_name,
-            language='en',
-            sort_by='relevancy',
-            page_size=100 
-        )
-
-        # 4. Check the status of the API response
-        if response.get('status') != 'ok':
-            # If the API returns an error, print it clearly
-            error_code = response.get('code')
-            error_message = response.get('message')
-            print(f"🔴 NewsAPI ERROR: {error_code} - {error_message}")
-            return []
-
-        articles = response.get('articles', [])
-        print(f"✅ Found {len(articles)} articles for '{company_name}'.")
+        # 2. Reuse the process-wide News API Client
+        newsapi = get_newsapi_client(NEWS_API_KEY)
+
+        # 3. Only ask for articles published since the newest one seen for this query
+        state = news_state.load(company_name)
+        since = state["cursor"]
+        articles = []
+        for page in range(1, NEWS_MAX_PAGES + 1):
+            response = call_provider(
+                "newsapi", newsapi.get_everything,
+                q=company_name,
+                language='en',
+                # Deltas come newest first. If more than NEWS_MAX_PAGES pages are new, the
+                # older ones are skipped and the cursor still moves to the newest article.
+                # They would not fit in the stored window (max_items) anyway.
+                sort_by='publishedAt' if since else 'relevancy',
+                from_param=since,
+                page_size=NEWS_PAGE_SIZE,
+                page=page,
+            )
+
+            # 4. Check the status of the API response
+            if response.get('status') != 'ok':
+                # If the API returns an error, print it clearly
+                error_code = response.get('code')
+                error_message = response.get('message')
+                print(f"🔴 NewsAPI ERROR: {error_code} - {error_message}")
+                if not articles:
+                    return state["items"]
+                break
+
+            page_articles = response.get('articles', [])
+            articles.extend(page_articles)
+            if len(page_articles) < NEWS_PAGE_SIZE or len(articles) >= response.get('totalResults', 0):
+                break
+        print(f"✅ Found {len(articles)} {'new ' if since else ''}articles for '{company_name}'.")
 
         # 5. Format the response and add the essential 'source' tag
         formatted_articles = []
@@ -50,9 +79,12 @@ def fetch_news(company_name):
                 'url': article.get('url')
             })
 
-        return formatted_articles
+        # The client only accepts 'YYYY-MM-DDTHH:MM:SS', so the trailing 'Z' is dropped.
+        published = [article['publishedAt'][:19] for article in articles if article.get('publishedAt')]
+        return news_state.merge(company_name, state, formatted_articles, cursor=max(published) if published else None)
 
     except Exception as e:
         # 6. Handle any other exceptions during the process
         print(f"🔴 An unexpected exception occurred while fetching news for '{company_name}': {e}")
-        return []
+        # Fall back to the articles already collected for this query, if any.
+        return news_state.load(company_name)["items"]
@@ -1,117 +1,180 @@
 import os
-from googleapiclient.discovery import build
 import tweepy
 from dotenv import load_dotenv
 
+from clients import get_twitter_client, get_youtube_client
+from feed_state import FeedState
+from fetch_cache import cached_fetch
+from scheduler import call_provider
+
 # Load environment variables from the .env file
 load_dotenv()
 TWITTER_BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 
+# Pages fetched per run; raise them for deeper history on a query's first fetch.
+TWITTER_MAX_PAGES = int(os.getenv("TWITTER_MAX_PAGES", "1"))
+YOUTUBE_MAX_PAGES = int(os.getenv("YOUTUBE_MAX_PAGES", "1"))
+TWITTER_PAGE_SIZE = 100
+# Recent search rejects a since_id older than seven days; past this age it is dropped and the newest tweets are fetched again.
+TWITTER_SINCE_ID_MAX_AGE = float(os.getenv("TWITTER_SINCE_ID_MAX_AGE", str(6 * 24 * 3600)))
+# Tweet ids are snowflakes: the top bits hold milliseconds since this epoch.
+_TWITTER_EPOCH_MS = 1288834974657
+YOUTUBE_PAGE_SIZE = 50
+
+twitter_state = FeedState("twitter", max_items=TWITTER_PAGE_SIZE * TWITTER_MAX_PAGES)
+youtube_state = FeedState("youtube", max_items=YOUTUBE_PAGE_SIZE * YOUTUBE_MAX_PAGES)
+
+def _fetch_tweet_pages(endpoint, token_param, since_id=None, **params):
+    """
+    Calls a paginated Twitter v2 endpoint for up to TWITTER_MAX_PAGES pages of
+    tweets newer than `since_id`. Returns (tweets, newest tweet id).
+    """
+    tweets, newest_id, token = [], None, None
+    for _ in range(TWITTER_MAX_PAGES):
+        page_params = {**params, "max_results": TWITTER_PAGE_SIZE}
+        if since_id:
+            page_params["since_id"] = since_id
+        if token:
+            page_params[token_param] = token
+        response = call_provider("twitter", endpoint, **page_params)
+        tweets.extend(response.data or [])
+        meta = getattr(response, "meta", None) or {}
+        newest_id = newest_id or meta.get("newest_id")
+        token = meta.get("next_token")
+        if not token:
+            break
+    if newest_id is None and tweets:
+        newest_id = str(max(int(tweet.id) for tweet in tweets))
+    return tweets, newest_id
+
+def _tweet_time(tweet_id):
+    """Unix time a tweet was posted, read from its id."""
+    return ((int(tweet_id) >> 22) + _TWITTER_EPOCH_MS) / 1000 if tweet_id else None
+
 # --- Twitter Data Fetching (Using modern Twitter API v2) ---
+@cached_fetch("twitter", ttl=float(os.getenv("TWITTER_CACHE_TTL", "300")))
 def fetch_twitter_data(query):
     """
     Fetches tweets using Twitter API v2. It can handle a search query
-    or a specific user handle (e.g., '@twitterdev').
+    or a specific user handle (e.g., '@twitterdev'). Later runs only ask
+    for tweets newer than the last seen id (since_id).
     """
     if not TWITTER_BEARER_TOKEN:
         print("Error: TWITTER_BEARER_TOKEN not found in .env. Twitter fetching is disabled.")
         return []
     
-    # Initialize the client with your Bearer Token
-    client = tweepy.Client(bearer_token=TWITTER_BEARER_TOKEN)
+    # Reuse the process-wide client built with your Bearer Token
+    client = get_twitter_client(TWITTER_BEARER_TOKEN)
     
+    state = twitter_state.load(query)
     try:
         if query.startswith('@'):
             handle = query.lstrip('@')
-            # Step 1: Get the user object from the handle to find their ID
-            user_response = client.get_user(username=handle)
-            if not user_response.data:
-                print(f"Twitter user '{handle}' not found.")
-                return []
-            user_id = user_response.data.id
-            
-            # Step 2: Use the user ID to fetch their recent tweets
-            tweets_response = client.get_users_tweets(id=user_id, max_results=100)
-            tweets = tweets_response.data or []
-            
-            return [{
-                'source': 'Twitter',
-                'text': tweet.text,
-                'description': tweet.text,
-                'url': f"https://twitter.com/{handle}/status/{tweet.id}"
-            } for tweet in tweets]
+            # Step 1: Get the user object from the handle to find their ID (remembered after the first run)
+            user_id = state["meta"].get("user_id")
+            if not user_id:
+                user_response = call_provider("twitter", client.get_user, username=handle)
+                if not user_response.data:
+                    print(f"Twitter user '{handle}' not found.")
+                    return []
+                user_id = user_response.data.id
+
+            # Step 2: Use the user ID to fetch their tweets newer than the last one seen
+            tweets, newest_id = _fetch_tweet_pages(client.get_users_tweets, "pagination_token", id=user_id, since_id=state["cursor"])
+            url_prefix = f"https://twitter.com/{handle}/status/"
+            meta = {"user_id": user_id}
         else:
             # For general searches, use the recent search endpoint
-            # --- CHANGED: Increased max_results from 1 to 100 ---
-            search_response = client.search_recent_tweets(query=query, max_results=100)
-            tweets = search_response.data or []
+            since_id = state["cursor"]
+            age = twitter_state.cursor_age(state)
+            if since_id and (age is None or age > TWITTER_SINCE_ID_MAX_AGE):
+                since_id = None
+            tweets, newest_id = _fetch_tweet_pages(client.search_recent_tweets, "next_token", query=query, since_id=since_id)
+            url_prefix = "https://twitter.com/i/web/status/"
+            meta = None
 
-            return [{
-                'source': 'Twitter',
-                'text': tweet.text,
-                'description': tweet.text,
-                'url': f"https://twitter.com/i/web/status/{tweet.id}"
-            } for tweet in tweets]
+        return twitter_state.merge(query, state, [{
+            'source': 'Twitter',
+            'text': tweet.text,
+            'description': tweet.text,
+            'url': f"{url_prefix}{tweet.id}"
+        } for tweet in tweets], cursor=newest_id, meta=meta, cursor_at=_tweet_time(newest_id))
 
     except tweepy.errors.TweepyException as e:
         # Provide specific feedback for API-related errors
         print(f"An error occurred with the Twitter API for query '{query}': {e}")
-        return []
+        return state["items"]
     except Exception as e:
         print(f"An unexpected error occurred fetching Twitter data for '{query}': {e}")
-        return []
+        return state["items"]
 
 # --- YouTube Data Fetching (With robust handle and URL lookup) ---
+@cached_fetch("youtube", ttl=float(os.getenv("YOUTUBE_CACHE_TTL", "1800")))
 def fetch_youtube_data(query):
     """
     Fetches recent videos from a YouTube channel using a search query,
     a direct channel URL, or a handle URL (e.g., youtube.com/@mkbhd).
+    Later runs only keep uploads newer than the last seen publish time.
     """
     if not YOUTUBE_API_KEY:
         print("Error: YOUTUBE_API_KEY not found in .env. YouTube fetching is disabled.")
         return []
         
-    youtube = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
-    
+    state = youtube_state.load(query)
     try:
-        channel_id = None
-        # Robust logic to find the channel ID from various input types
-        if "youtube.com/" in query:
-            if "/@" in query:
-                handle = query.split("/@")[1].split('/')[0]
-                search_response = youtube.search().list(part='snippet', q=handle, type='channel', maxResults=1).execute()
+        youtube = get_youtube_client(YOUTUBE_API_KEY)
+
+        # The uploads playlist is remembered per query, which saves the channel search (100 quota units) on later runs
+        uploads_playlist_id = state["meta"].get("uploads_playlist_id")
+        if not uploads_playlist_id:
+            channel_id = None
+            # Robust logic to find the channel ID from various input types
+            if "youtube.com/" in query:
+                if "/@" in query:
+                    handle = query.split("/@")[1].split('/')[0]
+                    search_response = call_provider("youtube", youtube.search().list(part='snippet', q=handle, type='channel', maxResults=1).execute)
+                    if search_response.get('items'):
+                        channel_id = search_response['items'][0]['id']['channelId']
+                elif "/channel/" in query:
+                    channel_id = query.split("/channel/")[1].split('/')[0]
+
+            if not channel_id:
+                # If input is not a URL, treat it as a general search query
+                search_response = call_provider("youtube", youtube.search().list(part='snippet', q=query, type='channel', maxResults=1).execute)
                 if search_response.get('items'):
                     channel_id = search_response['items'][0]['id']['channelId']
-            elif "/channel/" in query:
-                channel_id = query.split("/channel/")[1].split('/')[0]
-        
-        if not channel_id:
-            # If input is not a URL, treat it as a general search query
-            search_response = youtube.search().list(part='snippet', q=query, type='channel', maxResults=1).execute()
-            if search_response.get('items'):
-                channel_id = search_response['items'][0]['id']['channelId']
-
-        if not channel_id:
-            print(f"Could not find a YouTube channel for query: '{query}'")
-            return []
-
-        # Use the channel ID to find the playlist of all uploads
-        channel_response = youtube.channels().list(part='contentDetails', id=channel_id).execute()
-        uploads_playlist_id = channel_response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
-
-        # Fetch the most recent videos from that playlist
-        # --- CHANGED: Increased maxResults from 10 to 50 ---
-        playlist_response = youtube.playlistItems().list(playlistId=uploads_playlist_id, part='snippet', maxResults=50).execute()
-        
-        return [{
+
+            if not channel_id:
+                print(f"Could not find a YouTube channel for query: '{query}'")
+                return []
+
+            # Use the channel ID to find the playlist of all uploads
+            channel_response = call_provider("youtube", youtube.channels().list(part='contentDetails', id=channel_id).execute)
+            uploads_playlist_id = channel_response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
+
+        # Fetch the videos published since the newest one seen; uploads are listed newest first
+        since = state["cursor"]
+        items, page_token = [], None
+        for _ in range(YOUTUBE_MAX_PAGES):
+            playlist_response = call_provider("youtube", youtube.playlistItems().list(
+                playlistId=uploads_playlist_id, part='snippet', maxResults=YOUTUBE_PAGE_SIZE, pageToken=page_token).execute)
+            page_items = playlist_response.get('items', [])
+            new_items = [item for item in page_items if not since or item['snippet'].get('publishedAt', '') > since]
+            items.extend(new_items)
+            page_token = playlist_response.get('nextPageToken')
+            if not page_token or len(new_items) < len(page_items):
+                break
+
+        published = [item['snippet']['publishedAt'] for item in items if item['snippet'].get('publishedAt')]
+        return youtube_state.merge(query, state, [{
             'source': 'YouTube',
             'title': item['snippet']['title'],
             'description': item['snippet']['description'],
             'url': f"https://www.youtube.com/watch?v={item['snippet']['resourceId']['videoId']}"
-        } for item in playlist_response.get('items', [])]
-        
+        } for item in items], cursor=max(published) if published else None, meta={"uploads_playlist_id": uploads_playlist_id})
+
     except Exception as e:
         # Provide specific feedback for API-related errors
         print(f"An error occurred fetching YouTube data for '{query}': {e}")
-        return []
+        return state["items"]
@@ -1,6 +1,7 @@
 # fetch_trends.py
 
-import yfinance as yf
+from stock_store import stock_store
+from ticker_index import get_index
 
 COMPANY_TICKER_MAP = {
     "apple": "AAPL", "@apple": "AAPL",
@@ -32,26 +33,38 @@ COMPANY_TICKER_MAP = {
     "ey": None, "deloitte": None, "pwc": None
 }
 
-def get_stock_trends(company_name):
-    try:
-        ticker_symbol = COMPANY_TICKER_MAP.get(company_name.lower())
-        
-        if not ticker_symbol:
-            print(f"'{company_name}' is not in the list of tracked companies.")
-            return None
+def resolve_ticker(company_name):
+    """
+    Looks the name, alias, @handle or profile URL up in the listings index
+    (TICKER_LISTINGS_FILE); COMPANY_TICKER_MAP is kept as built-in aliases.
+    """
+    symbol, _ = get_index(COMPANY_TICKER_MAP).lookup(company_name)
+    return symbol
 
-        stock = yf.Ticker(ticker_symbol)
-        hist = stock.history(period="100d")
+def get_stock_trends_bulk(company_names):
+    """
+    Returns {company_name: [{"date", "price"}, ...] or None} for every name.
+    All resolved tickers are served from the local store, which downloads any
+    missing recent days for them in a single batched request.
+    """
+    tickers = {name: resolve_ticker(name) for name in company_names}
+    for name, ticker in tickers.items():
+        if not ticker:
+            print(f"'{name}' is not in the list of tracked companies.")
 
-        if hist.empty:
-            print(f"No historical data found for ticker '{ticker_symbol}'.")
-            return None
-
-        return [
-            {"date": str(date.date()), "price": float(row["Close"])}
-            for date, row in hist.iterrows()
-        ]
-        
+    try:
+        history = stock_store.history([ticker for ticker in tickers.values() if ticker])
     except Exception as e:
-        print(f"An error occurred fetching stock data for '{company_name}': {e}")
-        return None
\ No newline at end of file
+        print(f"An error occurred fetching stock data for {', '.join(company_names)}: {e}")
+        return {name: None for name in company_names}
+
+    trends = {}
+    for name, ticker in tickers.items():
+        trends[name] = history.get(ticker) if ticker else None
+        if ticker and not trends[name]:
+            print(f"No historical data found for ticker '{ticker}'.")
+            trends[name] = None
+    return trends
+
+def get_stock_trends(company_name):
+    return get_stock_trends_bulk([company_name])[company_name]
@@ -0,0 +1,107 @@
+# jobs.py
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Finished jobs are kept this long (seconds) so clients can still poll for the result.
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "3600"))
+
+class Job:
+    """A single background analysis and everything a client can poll about it."""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._lock = threading.Lock()
+
+    def update_progress(self, **counts):
+        with self._lock:
+            self.progress.update(counts)
+            self.updated_at = time.time()
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.progress[name] = self.progress.get(name, 0) + amount
+            self.updated_at = time.time()
+
+    def _set_status(self, status, result=None, error=None):
+        with self._lock:
+            self.status, self.result, self.error = status, result, error
+            self.updated_at = time.time()
+
+    def to_dict(self):
+        with self._lock:
+            payload = {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "progress": dict(self.progress),
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+            }
+            if self.status == "done":
+                payload["result"] = self.result
+            if self.status == "failed":
+                payload["error"] = self.error
+            return payload
+
+class JobQueue:
+    """
+    An in-process job queue backed by a small worker pool. Jobs live in this
+    process only, so with several server processes clients must poll the
+    process that accepted the job (e.g. run the job API with sticky sessions
+    or a single worker).
+    """
+
+    def __init__(self, workers=JOB_WORKERS, retention=JOB_RETENTION):
+        self.retention = retention
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    def submit(self, kind, fn, *args, progress=None, **kwargs):
+        """
+        Queues `fn(job, *args, **kwargs)`; its return value becomes the job
+        result. `progress` seeds the job's progress counters.
+        """
+        self._purge_finished()
+        job = Job(kind)
+        job.progress.update(progress or {})
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        job._set_status("running")
+        try:
+            job._set_status("done", result=fn(job, *args, **kwargs))
+        except Exception as e:
+            traceback.print_exc()
+            print(f"🔴 Job {job.id} ({job.kind}) failed: {e}")
+            job._set_status("failed", error=str(e))
+
+    def _purge_finished(self):
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.status in ("done", "failed") and job.updated_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
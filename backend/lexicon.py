@@ -0,0 +1,102 @@
+# lexicon.py
+
+import os
+import re
+import string
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+# Items are labelled locally only when VADER's compound score is at least this far
+# from zero and the text contains enough sentiment-bearing words; the rest escalate.
+LEXICON_POSITIVE_THRESHOLD = float(os.getenv("LEXICON_POSITIVE_THRESHOLD", "0.6"))
+LEXICON_NEGATIVE_THRESHOLD = float(os.getenv("LEXICON_NEGATIVE_THRESHOLD", "0.6"))
+LEXICON_MIN_HITS = int(os.getenv("LEXICON_MIN_HITS", "2"))
+
+# Keyword hints used to pick a category for items that never reach the LLM.
+CATEGORY_KEYWORDS = {
+    "Company News & Financials": ("earnings", "revenue", "profit", "stock", "shares", "quarter", "investor", "ceo", "acquisition", "layoffs", "ipo", "market", "valuation"),
+    "Delivery & Shipping": ("delivery", "delivered", "shipping", "shipped", "package", "parcel", "courier", "arrived"),
+    "Customer Service": ("support", "service", "refund", "agent", "helpdesk", "complaint", "customer care", "representative"),
+    "Price & Value": ("price", "expensive", "cheap", "cost", "discount", "deal", "value", "pricing", "subscription"),
+    "Website & App Experience": ("app", "website", "update", "login", "site", "interface", "checkout", "bug", "crash"),
+    "Product Quality": ("quality", "product", "battery", "device", "broken", "durable", "works", "feature", "camera", "build"),
+}
+# Whole words or phrases only (plus a plural 's'), so "app" does not match "happy" or "apple".
+_CATEGORY_PATTERNS = {
+    category: re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")s?\b")
+    for category, keywords in CATEGORY_KEYWORDS.items()
+}
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+_PUNCTUATION = str.maketrans("", "", string.punctuation.replace("'", ""))
+
+def _get_analyzer():
+    """Loads the VADER analyzer once; returns None if the lexicon is not installed."""
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                try:
+                    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+                    _analyzer = SentimentIntensityAnalyzer()
+                except (ImportError, LookupError) as e:
+                    print(f"🟡 VADER lexicon unavailable ({e}); run download_lexicon.py. Every item will go to the LLM.")
+                    _analyzer = False
+    return _analyzer or None
+
+def score_texts(texts):
+    """
+    Scores every text with VADER in one pass. Returns two arrays: the
+    compound score (-1..1) and the number of lexicon words found in each text.
+    """
+    analyzer = _get_analyzer()
+    count = len(texts)
+    compound = np.zeros(count, dtype=np.float32)
+    hits = np.zeros(count, dtype=np.int16)
+    if analyzer is None:
+        return compound, hits
+    lexicon = analyzer.lexicon
+    for i, text in enumerate(texts):
+        if not text or not isinstance(text, str):
+            continue
+        compound[i] = analyzer.polarity_scores(text[:800])["compound"]
+        hits[i] = sum(1 for word in text[:800].lower().translate(_PUNCTUATION).split() if word in lexicon)
+    return compound, hits
+
+def confident_labels(compound, hits):
+    """
+    Vectorized decision over the scores: returns an array of 'positive',
+    'negative' or '' (meaning the item should be escalated to the LLM).
+    """
+    labels = np.full(len(compound), "", dtype=object)
+    enough_words = hits >= LEXICON_MIN_HITS
+    labels[enough_words & (compound >= LEXICON_POSITIVE_THRESHOLD)] = "positive"
+    labels[enough_words & (compound <= -LEXICON_NEGATIVE_THRESHOLD)] = "negative"
+    return labels
+
+def guess_category(text):
+    """The category whose keywords occur most often in the text; 'Other' if none do."""
+    lowered = text.lower()
+    best, best_hits = "Other", 0
+    for category, pattern in _CATEGORY_PATTERNS.items():
+        found = len(set(pattern.findall(lowered)))
+        if found > best_hits:
+            best, best_hits = category, found
+    return best
+
+def explain(text, label):
+    """A short reason made of the strongest lexicon words that agree with the label."""
+    analyzer = _get_analyzer()
+    if analyzer is None:
+        return "lexicon score"
+    sign = 1 if label == "positive" else -1
+    words = {}
+    for word in text[:800].lower().translate(_PUNCTUATION).split():
+        valence = analyzer.lexicon.get(word, 0) * sign
+        if valence > 0:
+            words[word] = valence
+    strongest = sorted(words, key=words.get, reverse=True)[:2]
+    return ", ".join(strongest) if strongest else f"{label} wording"
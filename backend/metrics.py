@@ -0,0 +1,192 @@
+# metrics.py
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+# Latency quantiles are computed over this many most recent observations per series.
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1024"))
+QUANTILES = (0.5, 0.95)
+
+_lock = threading.Lock()
+_counters = {}
+_summaries = {}
+_help = {}
+
+class _Summary:
+    """Count and sum of every observation, plus a sliding window for quantiles."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.window = deque(maxlen=METRICS_WINDOW)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.window.append(value)
+
+    def quantile(self, q):
+        if not self.window:
+            return 0.0
+        ordered = sorted(self.window)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+def _series(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def describe(name, help_text):
+    _help[name] = help_text
+
+def inc(name, amount=1, **labels):
+    """Adds to a counter, e.g. inc("items_fetched_total", 20, source="articles")."""
+    key = _series(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name, value, **labels):
+    """Records one observation (usually seconds) of a summary metric."""
+    key = _series(name, labels)
+    with _lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            summary = _summaries[key] = _Summary()
+        summary.observe(value)
+
+def snapshot():
+    """Every counter and summary as plain dicts keyed by name and then by 'label=value,...'."""
+    def label_key(labels):
+        return ",".join(f"{name}={value}" for name, value in labels)
+    result = {"counters": {}, "summaries": {}}
+    with _lock:
+        for (name, labels), value in _counters.items():
+            result["counters"].setdefault(name, {})[label_key(labels)] = value
+        for (name, labels), summary in _summaries.items():
+            result["summaries"].setdefault(name, {})[label_key(labels)] = {
+                "count": summary.count, "sum": round(summary.total, 6),
+                **{f"p{int(q * 100)}": round(summary.quantile(q), 6) for q in QUANTILES},
+            }
+    return result
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _summaries.clear()
+
+# --- Per-request timing breakdown ---
+
+class Timings:
+    """Seconds spent per stage during one request; shared with the worker threads it fans out to."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0.0) + seconds
+
+    def to_dict(self):
+        with self._lock:
+            stages = {stage: round(seconds, 4) for stage, seconds in self._stages.items()}
+        return {**stages, "total": round(time.monotonic() - self.started, 4)}
+
+_timings = contextvars.ContextVar("request_timings", default=None)
+
+@contextmanager
+def collect_timings():
+    """Collects the spans of everything run inside the block (and in threads it submits with context)."""
+    timings = Timings()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+def add_timing(name, seconds):
+    """Adds to the current request's breakdown, if one is being collected."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+@contextmanager
+def span(stage, **labels):
+    """
+    Times the enclosed block into stage_seconds{stage=...} and the current
+    request's timing breakdown; an exception also counts in errors_total.
+    """
+    started = time.monotonic()
+    try:
+        yield
+    except Exception:
+        inc("errors_total", stage=stage, **labels)
+        raise
+    finally:
+        seconds = time.monotonic() - started
+        observe("stage_seconds", seconds, stage=stage, **labels)
+        add_timing(stage, seconds)
+
+# --- Prometheus text exposition ---
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render(extra_families=()):
+    """
+    Renders every counter and summary in the Prometheus text format, plus
+    `extra_families`: (name, type, help, [(labels dict, value), ...]) tuples
+    for values other modules already keep (cache and provider stats, ...).
+    """
+    with _lock:
+        counters = dict(_counters)
+        summaries = {key: (s.count, s.total, [s.quantile(q) for q in QUANTILES]) for key, s in _summaries.items()}
+
+    families = {}
+    for (name, labels), value in counters.items():
+        families.setdefault((name, "counter"), []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for (name, labels), (count, total, quantiles) in summaries.items():
+        lines = families.setdefault((name, "summary"), [])
+        for q, value in zip(QUANTILES, quantiles):
+            lines.append(f"{name}{_format_labels(labels + (('quantile', q),))} {_format_value(value)}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    for name, metric_type, help_text, samples in extra_families:
+        _help.setdefault(name, help_text)
+        lines = families.setdefault((name, metric_type), [])
+        for labels, value in samples:
+            if value is not None:
+                lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}")
+
+    output = []
+    for (name, metric_type), lines in sorted(families.items()):
+        if name in _help:
+            output.append(f"# HELP {name} {_help[name]}")
+        output.append(f"# TYPE {name} {metric_type}")
+        output.extend(lines)
+    return "\n".join(output) + "\n"
+
+describe("stage_seconds", "Time spent in each analysis stage.")
+describe("errors_total", "Failures per stage.")
+describe("provider_call_seconds", "Latency of outbound provider calls, including retries.")
+describe("fetch_source_seconds", "Time from submission to result for each source fetch.")
+describe("fetch_timeouts_total", "Source fetches dropped at their deadline.")
+describe("items_fetched_total", "Items returned by each source.")
+describe("http_request_seconds", "Request latency per endpoint.")
+describe("http_requests_total", "Requests per endpoint and status.")
+describe("http_response_bytes_total", "Response bytes sent per endpoint.")
@@ -0,0 +1,182 @@
+# prewarm.py
+
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+
+from cache import CACHE_DB_PATH
+from scheduler import BACKGROUND, lane_calls, request_priority
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; every process then runs its own pre-warmer.
+    fcntl = None
+
+load_dotenv()
+# Comma-separated companies that are always kept warm, ahead of the most requested ones.
+WATCHLIST = [name.strip() for name in os.getenv("WATCHLIST", "").split(",") if name.strip()]
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "1" if WATCHLIST else "0") == "1"
+PREWARM_INTERVAL = float(os.getenv("PREWARM_INTERVAL", "900"))
+PREWARM_MAX_QUERIES = int(os.getenv("PREWARM_MAX_QUERIES", "50"))
+# Background-lane upstream calls (all providers together) a cycle may spend before the remaining queries wait for the next one.
+PREWARM_CALL_BUDGET = int(os.getenv("PREWARM_CALL_BUDGET", "300"))
+# Only the process holding this lock pre-warms, so N server workers do not run every cycle N times.
+PREWARM_LOCK_FILE = os.getenv("PREWARM_LOCK_FILE", os.path.join(os.path.dirname(CACHE_DB_PATH), "prewarm.lock"))
+# Request counts halve over this many seconds, so "most requested" follows recent usage.
+PREWARM_HALF_LIFE = float(os.getenv("PREWARM_HALF_LIFE", str(24 * 3600)))
+
+def _decayed(count, counted_at, now):
+    return count * 0.5 ** ((now - counted_at) / PREWARM_HALF_LIFE)
+
+class Prewarmer:
+    """
+    Keeps the watchlist and the most requested companies warm. Every
+    `interval` seconds a background thread calls `warm_query(query)` for each
+    of them in the BACKGROUND lane, most important first, until the cycle's
+    upstream call budget is spent.
+
+    When several server processes import the app, each starts a Prewarmer,
+    but only the one holding `lock_file` runs cycles; the others keep trying
+    to take the lock and take over if that process exits.
+    """
+
+    def __init__(self, warm_query, watchlist=WATCHLIST, interval=PREWARM_INTERVAL,
+                 max_queries=PREWARM_MAX_QUERIES, call_budget=PREWARM_CALL_BUDGET, lock_file=PREWARM_LOCK_FILE, db_path=CACHE_DB_PATH):
+        self.warm_query = warm_query
+        self.watchlist = list(watchlist)
+        self.interval = interval
+        self.max_queries = max_queries
+        self.call_budget = call_budget
+        self.lock_file = lock_file
+        self._lock_handle = None
+        # Request counts live in the shared cache database, so every server process adds to the same ranking.
+        self.db_path = db_path
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"cycles": 0, "queries_warmed": 0, "failures": 0, "deferred_for_budget": 0,
+                      "last_cycle_at": None, "last_cycle_seconds": None, "last_cycle_calls": None}
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS prewarm_counts (query TEXT PRIMARY KEY, count REAL NOT NULL, counted_at REAL NOT NULL)")
+            conn.create_function("decayed", 3, _decayed, deterministic=True)
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def record_queries(self, queries):
+        """Counts companies requested by users; the most requested ones are pre-warmed."""
+        queries = [query.strip().lower() for query in queries if query.strip()]
+        if not queries:
+            return
+        now = time.time()
+        try:
+            conn = self._connection()
+            # Decays and increments in one statement, so concurrent processes never overwrite each other's counts.
+            conn.executemany(
+                "INSERT INTO prewarm_counts (query, count, counted_at) VALUES (?, 1, ?) "
+                "ON CONFLICT(query) DO UPDATE SET count = decayed(count, counted_at, excluded.counted_at) + 1, counted_at = excluded.counted_at",
+                [(query, now) for query in queries],
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"🟡 Could not record requested queries for pre-warming: {e}")
+
+    def _ranked(self):
+        """Every counted query with its decayed count, most requested first; forgets ones that have decayed away."""
+        now = time.time()
+        conn = self._connection()
+        counts = [(query, _decayed(count, counted_at, now)) for query, count, counted_at in
+                  conn.execute("SELECT query, count, counted_at FROM prewarm_counts").fetchall()]
+        conn.execute("DELETE FROM prewarm_counts WHERE decayed(count, counted_at, ?) < 0.05", (now,))
+        conn.commit()
+        return sorted((item for item in counts if item[1] >= 0.05), key=lambda item: item[1], reverse=True)
+
+    def hot_queries(self):
+        """The watchlist followed by the most requested companies across all processes, up to max_queries."""
+        try:
+            ranked = [query for query, _ in self._ranked()]
+        except sqlite3.Error as e:
+            print(f"🟡 Could not read request counts for pre-warming: {e}")
+            ranked = []
+        queries = list(dict.fromkeys([query.lower() for query in self.watchlist] + ranked))
+        return queries[:self.max_queries]
+
+    def run_cycle(self):
+        """Warms every hot query once, stopping early when the call budget is used up."""
+        started, calls_at_start = time.time(), lane_calls(BACKGROUND)
+        queries, warmed = self.hot_queries(), 0
+        with request_priority(BACKGROUND):
+            for position, query in enumerate(queries):
+                if self._stop.is_set():
+                    break
+                if lane_calls(BACKGROUND) - calls_at_start >= self.call_budget:
+                    deferred = len(queries) - position
+                    self.stats["deferred_for_budget"] += deferred
+                    print(f"🟡 Pre-warm call budget of {self.call_budget} spent; {deferred} queries wait for the next cycle.")
+                    break
+                try:
+                    self.warm_query(query)
+                    warmed += 1
+                except Exception as e:
+                    self.stats["failures"] += 1
+                    print(f"🔴 Pre-warming '{query}' failed: {e}")
+        self.stats.update(cycles=self.stats["cycles"] + 1, queries_warmed=self.stats["queries_warmed"] + warmed, last_cycle_at=started,
+                          last_cycle_seconds=round(time.time() - started, 3), last_cycle_calls=lane_calls(BACKGROUND) - calls_at_start)
+        print(f"✅ Pre-warmed {warmed} of {len(queries)} queries in {self.stats['last_cycle_seconds']}s.")
+
+    def _elected(self):
+        """Takes the process-wide runner lock if no other process holds it. Held until this process exits."""
+        if self._lock_handle is not None or fcntl is None or not self.lock_file:
+            return True
+        directory = os.path.dirname(self.lock_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handle = open(self.lock_file, "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._lock_handle = handle
+        print(f"🔵 This process (pid {os.getpid()}) runs the pre-warmer.")
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._elected():
+                    self.run_cycle()
+            except Exception as e:
+                print(f"🔴 Pre-warm cycle failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="prewarm", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._lock_handle is not None:
+            self._lock_handle.close()  # Releases the runner lock for another process.
+            self._lock_handle = None
+
+    def to_dict(self):
+        try:
+            tracked = self._connection().execute("SELECT COUNT(*) FROM prewarm_counts").fetchone()[0]
+        except sqlite3.Error:
+            tracked = None
+        return {**self.stats, "running": self._thread is not None and self._thread.is_alive(),
+                "elected": self._lock_handle is not None or fcntl is None,
+                "interval": self.interval, "call_budget": self.call_budget,
+                "watchlist": len(self.watchlist), "tracked_queries": tracked}
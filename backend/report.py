@@ -1,95 +1,221 @@
+import functools
+import hashlib
+import io
+import json
+import os
+import threading
+import uuid
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER
+from dotenv import load_dotenv
 
-def generate_pdf_report(filename, queries, summary, data):
-    doc = SimpleDocTemplate(filename, rightMargin=inch/2, leftMargin=inch/2, topMargin=inch/2, bottomMargin=inch/2)
+from aggregate import ClassifiedItems
+
+try:
+    from pypdf import PdfWriter
+except ImportError:  # Without pypdf the report is built in one pass instead of from cached fragments.
+    PdfWriter = None
+
+load_dotenv()
+# Rendered company sections, reused by every report whose data for that company is unchanged.
+REPORT_FRAGMENTS_DIR = os.getenv("REPORT_FRAGMENTS_DIR", os.path.join(os.getenv("REPORTS_DIR", "reports"), "fragments"))
+REPORT_FRAGMENTS_MAX_BYTES = int(os.getenv("REPORT_FRAGMENTS_MAX_BYTES", str(512 * 1024 ** 2)))
+# Bump when the section layout changes so old fragments are not reused.
+REPORT_TEMPLATE_VERSION = "v1"
+
+SENTIMENT_TABLE_STYLE = TableStyle([('BACKGROUND', (0,0), (-1,0), colors.grey), ('TEXTCOLOR',(0,0),(-1,0),colors.whitesmoke), ('ALIGN', (0,0), (-1,-1), 'CENTER'), ('GRID', (0,0), (-1,-1), 1, colors.black)])
+
+@functools.lru_cache(maxsize=None)
+def _styles():
+    """The report's paragraph styles, compiled once per process."""
     styles = getSampleStyleSheet()
-    
-    # --- Custom Styles ---
-    title_style = ParagraphStyle(name='TitleStyle', parent=styles['h1'], fontSize=22, alignment=TA_CENTER, spaceAfter=20)
-    h2_style = ParagraphStyle(name='H2Style', parent=styles['h2'], fontSize=16, spaceBefore=20, spaceAfter=10, borderBottomWidth=1, borderBottomColor=colors.black, paddingBottom=5)
-    h3_style = ParagraphStyle(name='H3Style', parent=styles['h3'], fontSize=12, spaceBefore=10, spaceAfter=5, textColor=colors.darkblue)
     body_style = styles['BodyText']
-    bullet_style = ParagraphStyle(name='BulletStyle', parent=body_style, leftIndent=20, spaceAfter=2)
-    mention_style = ParagraphStyle(name='MentionStyle', parent=body_style, leftIndent=35, spaceAfter=2, textColor=colors.HexColor('#555555'))
-    description_style = ParagraphStyle(name='DescriptionStyle', parent=body_style, leftIndent=35, spaceAfter=8, textColor=colors.HexColor('#666666'), fontSize=9, leading=11)
-
-    story = []
-    story.append(Paragraph(f"Business Intelligence Report: {', '.join(queries)}", title_style))
-    story.append(Paragraph("Executive Summary", h2_style))
-    story.append(Paragraph(summary, body_style))
-    story.append(PageBreak())
-
-    for query in queries:
-        story.append(Paragraph(f"Detailed Analysis: {query}", title_style))
-        query_data = data.get(query, {})
-        if not query_data: continue
-
-        # --- Sentiment Analysis Section ---
-        story.append(Paragraph("Sentiment Analysis", h2_style))
-        story.append(Paragraph(f"<i>{query_data.get('sentiment_summary_text', '')}</i>", body_style))
-        story.append(Spacer(1, 0.2*inch))
-        
-        sentiment = query_data.get('sentiment_overview', {})
-        total = sentiment.get('total', 1)
-        sentiment_data = [
-            ['Sentiment', 'Count', 'Percentage'],
-            ['Positive', sentiment.get('positive', 0), f"{(sentiment.get('positive', 0)/total*100):.1f}%"],
-            ['Neutral', sentiment.get('neutral', 0), f"{(sentiment.get('neutral', 0)/total*100):.1f}%"],
-            ['Negative', sentiment.get('negative', 0), f"{(sentiment.get('negative', 0)/total*100):.1f}%"]
-        ]
-        table = Table(sentiment_data, colWidths=[2*inch, 1.5*inch, 1.5*inch])
-        table.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,0), colors.grey), ('TEXTCOLOR',(0,0),(-1,0),colors.whitesmoke), ('ALIGN', (0,0), (-1,-1), 'CENTER'), ('GRID', (0,0), (-1,-1), 1, colors.black)]))
-        story.append(table)
-        story.append(Spacer(1, 0.4*inch))
-
-        all_content = query_data.get('articles', []) + query_data.get('twitter_posts', []) + query_data.get('youtube_posts', [])
-
-        def add_sentiment_samples(sentiment_type, header_text):
-            story.append(Paragraph(header_text, h3_style))
-            content = [item for item in all_content if item.get('sentiment') == sentiment_type]
-            if content:
-                for item in content[:3]:
-                    source = item.get('source', 'News').replace('newsapi','News')
-                    title = (item.get('title') or item.get('description') or 'No title')[:100]
-                    description = (item.get('description', 'No description available.'))[:150]
-                    reason = item.get('reason', 'N/A')
-                    story.append(Paragraph(f"• <b>[{source}]</b> {title}...<br/>&nbsp;&nbsp;<i>Reason: {reason}</i>", mention_style))
-                    story.append(Paragraph(f"&nbsp;&nbsp;&nbsp;&nbsp;<i>{description}...</i>", description_style))
-            else:
-                story.append(Paragraph("No relevant mentions found.", body_style))
-
-        add_sentiment_samples('positive', "Key Positive Mentions")
-        add_sentiment_samples('negative', "Key Negative Mentions")
-
-        # --- Recent Media Mentions Section ---
-        story.append(Paragraph("Recent Media Mentions", h2_style))
-        
-        def add_source_mentions(source_name, source_key, source_label):
-            story.append(Paragraph(source_name, h3_style))
-            posts = query_data.get(source_key, [])
-            if posts:
-                for item in posts[:3]:
-                    title = (item.get('title') or 'No Title')[:120]
-                    description = (item.get('description', 'No description available.'))[:150]
-                    story.append(Paragraph(f"• <b>[{source_label}]</b> {title}...", bullet_style))
-                    story.append(Paragraph(f"&nbsp;&nbsp;&nbsp;&nbsp;<i>{description}...</i>", description_style))
-            else:
-                story.append(Paragraph("No recent posts found.", body_style))
-            story.append(Spacer(1, 0.1*inch))
-
-        add_source_mentions("News Articles", "articles", "News")
-        add_source_mentions("Twitter Posts", "twitter_posts", "Twitter")
-        add_source_mentions("YouTube Videos", "youtube_posts", "YouTube")
-
-        if query_data.get('stock_trends'):
-            story.append(Paragraph("Stock Performance", h2_style))
-            story.append(Paragraph("Stock trend data is available on the main dashboard.", body_style))
-        
-        if len(queries) > 1 and query != queries[-1]: 
-            story.append(PageBreak())
+    return {
+        'title': ParagraphStyle(name='TitleStyle', parent=styles['h1'], fontSize=22, alignment=TA_CENTER, spaceAfter=20),
+        'h2': ParagraphStyle(name='H2Style', parent=styles['h2'], fontSize=16, spaceBefore=20, spaceAfter=10, borderBottomWidth=1, borderBottomColor=colors.black, paddingBottom=5),
+        'h3': ParagraphStyle(name='H3Style', parent=styles['h3'], fontSize=12, spaceBefore=10, spaceAfter=5, textColor=colors.darkblue),
+        'body': body_style,
+        'bullet': ParagraphStyle(name='BulletStyle', parent=body_style, leftIndent=20, spaceAfter=2),
+        'mention': ParagraphStyle(name='MentionStyle', parent=body_style, leftIndent=35, spaceAfter=2, textColor=colors.HexColor('#555555')),
+        'description': ParagraphStyle(name='DescriptionStyle', parent=body_style, leftIndent=35, spaceAfter=8, textColor=colors.HexColor('#666666'), fontSize=9, leading=11),
+    }
 
+def _build(filename, story):
+    doc = SimpleDocTemplate(filename, rightMargin=inch/2, leftMargin=inch/2, topMargin=inch/2, bottomMargin=inch/2)
     doc.build(story)
+
+def _summary_story(queries, summary):
+    styles = _styles()
+    return [
+        Paragraph(f"Business Intelligence Report: {', '.join(queries)}", styles['title']),
+        Paragraph("Executive Summary", styles['h2']),
+        Paragraph(summary, styles['body']),
+    ]
+
+def _company_story(query, query_data):
+    """The 'Detailed Analysis' section for one company."""
+    styles = _styles()
+    story = [Paragraph(f"Detailed Analysis: {query}", styles['title'])]
+    if not query_data: return story
+
+    # --- Sentiment Analysis Section ---
+    story.append(Paragraph("Sentiment Analysis", styles['h2']))
+    story.append(Paragraph(f"<i>{query_data.get('sentiment_summary_text', '')}</i>", styles['body']))
+    story.append(Spacer(1, 0.2*inch))
+
+    sentiment = query_data.get('sentiment_overview', {})
+    total = sentiment.get('total', 1)
+    sentiment_data = [
+        ['Sentiment', 'Count', 'Percentage'],
+        ['Positive', sentiment.get('positive', 0), f"{(sentiment.get('positive', 0)/total*100):.1f}%"],
+        ['Neutral', sentiment.get('neutral', 0), f"{(sentiment.get('neutral', 0)/total*100):.1f}%"],
+        ['Negative', sentiment.get('negative', 0), f"{(sentiment.get('negative', 0)/total*100):.1f}%"]
+    ]
+    table = Table(sentiment_data, colWidths=[2*inch, 1.5*inch, 1.5*inch])
+    table.setStyle(SENTIMENT_TABLE_STYLE)
+    story.append(table)
+    story.append(Spacer(1, 0.4*inch))
+
+    classified = ClassifiedItems(query_data.get('articles', []) + query_data.get('twitter_posts', []) + query_data.get('youtube_posts', []))
+
+    def add_sentiment_samples(sentiment_type, header_text):
+        story.append(Paragraph(header_text, styles['h3']))
+        content = classified.samples(sentiment_type, limit=3)
+        if content:
+            for item in content:
+                source = item.get('source', 'News').replace('newsapi','News')
+                title = (item.get('title') or item.get('description') or 'No title')[:100]
+                description = (item.get('description', 'No description available.'))[:150]
+                reason = item.get('reason', 'N/A')
+                story.append(Paragraph(f"• <b>[{source}]</b> {title}...<br/>&nbsp;&nbsp;<i>Reason: {reason}</i>", styles['mention']))
+                story.append(Paragraph(f"&nbsp;&nbsp;&nbsp;&nbsp;<i>{description}...</i>", styles['description']))
+        else:
+            story.append(Paragraph("No relevant mentions found.", styles['body']))
+
+    add_sentiment_samples('positive', "Key Positive Mentions")
+    add_sentiment_samples('negative', "Key Negative Mentions")
+
+    # --- Recent Media Mentions Section ---
+    story.append(Paragraph("Recent Media Mentions", styles['h2']))
+
+    def add_source_mentions(source_name, source_key, source_label):
+        story.append(Paragraph(source_name, styles['h3']))
+        posts = query_data.get(source_key, [])
+        if posts:
+            for item in posts[:3]:
+                title = (item.get('title') or 'No Title')[:120]
+                description = (item.get('description', 'No description available.'))[:150]
+                story.append(Paragraph(f"• <b>[{source_label}]</b> {title}...", styles['bullet']))
+                story.append(Paragraph(f"&nbsp;&nbsp;&nbsp;&nbsp;<i>{description}...</i>", styles['description']))
+        else:
+            story.append(Paragraph("No recent posts found.", styles['body']))
+        story.append(Spacer(1, 0.1*inch))
+
+    add_source_mentions("News Articles", "articles", "News")
+    add_source_mentions("Twitter Posts", "twitter_posts", "Twitter")
+    add_source_mentions("YouTube Videos", "youtube_posts", "YouTube")
+
+    if query_data.get('stock_trends'):
+        story.append(Paragraph("Stock Performance", styles['h2']))
+        story.append(Paragraph("Stock trend data is available on the main dashboard.", styles['body']))
+    return story
+
+# --- Fragment cache ---
+_fragment_writes = 0
+_fragment_lock = threading.Lock()
+
+def _fragment_path(query, query_data):
+    digest = hashlib.sha256(
+        json.dumps([REPORT_TEMPLATE_VERSION, query, query_data], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(REPORT_FRAGMENTS_DIR, f"{digest}.pdf")
+
+def _company_fragment(query, query_data):
+    """
+    The company's rendered section as an in-memory PDF, built only if no
+    report has rendered the same data before. The bytes are read here so a
+    concurrent evict_fragments() cannot remove the file before it is merged.
+    """
+    path = _fragment_path(query, query_data)
+    try:
+        with open(path, "rb") as f:
+            fragment = f.read()
+        try:
+            os.utime(path)  # Marks it recently used for eviction.
+        except FileNotFoundError:
+            pass
+        return io.BytesIO(fragment)
+    except FileNotFoundError:
+        pass  # Not rendered yet, or evicted; render it (again).
+
+    os.makedirs(REPORT_FRAGMENTS_DIR, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    _build(tmp_path, _company_story(query, query_data))
+    with open(tmp_path, "rb") as f:
+        fragment = f.read()
+    os.replace(tmp_path, path)
+
+    global _fragment_writes
+    with _fragment_lock:
+        _fragment_writes += 1
+        should_evict = _fragment_writes % 50 == 0
+    if should_evict:
+        evict_fragments()
+    return io.BytesIO(fragment)
+
+def evict_fragments(max_bytes=None):
+    """Deletes the least recently used fragments until the cache fits in REPORT_FRAGMENTS_MAX_BYTES."""
+    max_bytes = REPORT_FRAGMENTS_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        entries = [entry for entry in os.scandir(REPORT_FRAGMENTS_DIR) if entry.name.endswith(".pdf")]
+    except FileNotFoundError:
+        return
+    fragments = []
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        fragments.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in fragments)
+    for _, size, path in sorted(fragments):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def generate_pdf_report(filename, queries, summary, data):
+    """
+    Renders the report as one fragment per section: the executive summary,
+    then each company's section, which is cached by a hash of its data and
+    reused by later reports. ReportLab lays out one section at a time, but
+    the merge is not streamed: pypdf keeps every fragment's pages in memory
+    until `filename` is written, so peak memory still grows with the number
+    of companies (by the size of their rendered pages, not their layout).
+    """
+    if PdfWriter is None:
+        story = _summary_story(queries, summary)
+        for query in queries:
+            story.append(PageBreak())
+            story.extend(_company_story(query, data.get(query, {})))
+        _build(filename, story)
+        return
+
+    summary_path = f"{filename}.{uuid.uuid4().hex}.summary.tmp"
+    try:
+        _build(summary_path, _summary_story(queries, summary))
+        writer = PdfWriter()
+        writer.append(summary_path)
+        for query in queries:
+            writer.append(_company_fragment(query, data.get(query, {})))
+        with open(filename, "wb") as f:
+            writer.write(f)
+    finally:
+        if os.path.exists(summary_path):
+            os.remove(summary_path)
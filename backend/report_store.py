@@ -0,0 +1,253 @@
+# report_store.py
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from report import generate_pdf_report
+
+load_dotenv()
+REPORTS_DIR = os.getenv("REPORTS_DIR", "reports")
+# When enabled, reports are also rendered ahead of time by a single background worker.
+REPORT_BACKGROUND_RENDER = os.getenv("REPORT_BACKGROUND_RENDER", "0") == "1"
+# Upper bounds for the store; least recently downloaded reports are evicted first.
+REPORTS_MAX_BYTES = int(os.getenv("REPORTS_MAX_BYTES", str(2 * 1024 ** 3)))
+REPORTS_MAX_AGE = float(os.getenv("REPORTS_MAX_AGE", str(7 * 24 * 3600)))
+
+_REPORT_ID = re.compile(r"^[0-9a-f]{32}$")
+# Reports written before the store existed: reports/<uuid4 with dashes>.pdf, linked as /download/<that name>.
+_LEGACY_NAME = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.pdf$")
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+class ReportStore:
+    """
+    Keeps the analysis payload behind every report and renders the PDF only
+    when it is first downloaded (or, optionally, by a low-priority background
+    worker). Rendered PDFs are kept on disk and served directly afterwards.
+
+    Files are sharded into subdirectories by the first two characters of the
+    report id, and a sqlite index records each report's size and last access
+    so lookups never scan the directory and the store can be kept within
+    REPORTS_MAX_BYTES / REPORTS_MAX_AGE. PDFs left at the top level by older
+    versions are moved into the index on startup and evicted like the rest.
+    """
+
+    def __init__(self, directory=REPORTS_DIR, background_render=REPORT_BACKGROUND_RENDER,
+                 max_bytes=REPORTS_MAX_BYTES, max_age=REPORTS_MAX_AGE):
+        self.directory = directory
+        self.background_render = background_render
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, "index.sqlite3")
+        self._local = threading.local()
+        self._render_locks = {}
+        self._locks_guard = threading.Lock()
+        # One worker keeps background rendering from competing with interactive requests.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-render") if background_render else None
+        if self.import_legacy_reports():
+            self.evict()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._index_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reports ("
+                "id TEXT PRIMARY KEY, created_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "payload_bytes INTEGER NOT NULL DEFAULT 0, pdf_bytes INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS reports_lru ON reports (accessed_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def parse_filename(filename):
+        """Returns the report id for '<id>.pdf' (or a legacy '<uuid>.pdf'), or None for anything else."""
+        if _LEGACY_NAME.match(filename):
+            return uuid.UUID(filename[:-4]).hex
+        report_id = filename[:-4] if filename.endswith(".pdf") else filename
+        return report_id if _REPORT_ID.match(report_id) else None
+
+    def import_legacy_reports(self):
+        """
+        Moves PDFs from the flat reports/<uuid>.pdf layout into their shards
+        and indexes them by file age, so old download links keep working until
+        the reports are evicted. Returns the number of reports imported.
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.is_file() and _LEGACY_NAME.match(entry.name)]
+        except FileNotFoundError:
+            return 0
+        conn = self._connection()
+        imported = 0
+        for entry in entries:
+            report_id = self.parse_filename(entry.name)
+            try:
+                stat = entry.stat()
+                os.makedirs(self._shard(report_id), exist_ok=True)
+                os.replace(entry.path, self.pdf_path(report_id))
+            except FileNotFoundError:
+                continue  # Imported by another process in the meantime.
+            # Legacy reports have no payload; once evicted they are gone, as before.
+            conn.execute(
+                "INSERT OR IGNORE INTO reports (id, created_at, accessed_at, pdf_bytes) VALUES (?, ?, ?, ?)",
+                (report_id, stat.st_mtime, stat.st_mtime, stat.st_size),
+            )
+            imported += 1
+        conn.commit()
+        if imported:
+            print(f"🔵 Imported {imported} reports from the old reports/ layout.")
+        return imported
+
+    def _shard(self, report_id):
+        return os.path.join(self.directory, report_id[:2])
+
+    def payload_path(self, report_id):
+        return os.path.join(self._shard(report_id), f"{report_id}.json")
+
+    def pdf_path(self, report_id):
+        return os.path.join(self._shard(report_id), f"{report_id}.pdf")
+
+    def save(self, queries, summary, data):
+        """Stores everything needed to render the report later and returns its id."""
+        report_id = uuid.uuid4().hex
+        os.makedirs(self._shard(report_id), exist_ok=True)
+        tmp_path = self.payload_path(report_id) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"queries": queries, "summary": summary, "data": data}, f)
+        os.replace(tmp_path, self.payload_path(report_id))
+
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO reports (id, created_at, accessed_at, payload_bytes) VALUES (?, ?, ?, ?)",
+            (report_id, now, now, _file_size(self.payload_path(report_id))),
+        )
+        conn.commit()
+        self.evict()
+
+        if self._executor is not None:
+            self._executor.submit(self._render_quietly, report_id)
+        return report_id
+
+    def exists(self, report_id):
+        row = self._connection().execute("SELECT 1 FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return row is not None
+
+    def _lock_for(self, report_id):
+        with self._locks_guard:
+            return self._render_locks.setdefault(report_id, threading.Lock())
+
+    def render(self, report_id, touch=True):
+        """
+        Returns the path of the rendered PDF, rendering it first if needed.
+        Concurrent callers for the same report wait for a single render.
+        `touch` marks the report as recently used for eviction purposes.
+        """
+        pdf_path = self.pdf_path(report_id)
+        rendered = False
+        if not os.path.exists(pdf_path):
+            with self._lock_for(report_id):
+                if not os.path.exists(pdf_path):
+                    with open(self.payload_path(report_id), encoding="utf-8") as f:
+                        payload = json.load(f)
+                    tmp_path = pdf_path + ".tmp"
+                    generate_pdf_report(tmp_path, payload["queries"], payload["summary"], payload["data"])
+                    os.replace(tmp_path, pdf_path)
+                    rendered = True
+            with self._locks_guard:
+                self._render_locks.pop(report_id, None)
+
+        conn = self._connection()
+        if rendered:
+            conn.execute("UPDATE reports SET pdf_bytes = ? WHERE id = ?", (_file_size(pdf_path), report_id))
+        if touch:
+            conn.execute("UPDATE reports SET accessed_at = ? WHERE id = ?", (time.time(), report_id))
+        conn.commit()
+        if rendered:
+            self.evict()
+        return pdf_path
+
+    def _render_quietly(self, report_id):
+        try:
+            self.render(report_id, touch=False)
+        except Exception as e:
+            print(f"🟡 Background rendering of report {report_id} failed: {e}")
+
+    def _delete(self, conn, report_id):
+        for path in (self.pdf_path(report_id), self.payload_path(report_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        conn.execute("DELETE FROM reports WHERE id = ?", (report_id,))
+
+    def evict(self):
+        """Removes reports older than max_age, then least recently used ones until under max_bytes."""
+        conn = self._connection()
+        evicted, evicted_bytes = 0, 0
+        try:
+            expired = conn.execute(
+                "SELECT id, payload_bytes + pdf_bytes FROM reports WHERE created_at < ?",
+                (time.time() - self.max_age,),
+            ).fetchall()
+            for report_id, size in expired:
+                self._delete(conn, report_id)
+                evicted, evicted_bytes = evicted + 1, evicted_bytes + size
+
+            total = conn.execute("SELECT COALESCE(SUM(payload_bytes + pdf_bytes), 0) FROM reports").fetchone()[0]
+            if total > self.max_bytes:
+                for report_id, size in conn.execute(
+                    "SELECT id, payload_bytes + pdf_bytes FROM reports ORDER BY accessed_at"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self._delete(conn, report_id)
+                    total -= size
+                    evicted, evicted_bytes = evicted + 1, evicted_bytes + size
+
+            if evicted:
+                for name, amount in (("evictions", evicted), ("evicted_bytes", evicted_bytes)):
+                    conn.execute(
+                        "INSERT INTO counters (name, value) VALUES (?, ?) "
+                        "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                        (name, amount),
+                    )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"🟡 Report eviction failed: {e}")
+        return evicted
+
+    def stats(self):
+        conn = self._connection()
+        count, payload_bytes, pdf_bytes, rendered = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(payload_bytes), 0), COALESCE(SUM(pdf_bytes), 0), "
+            "COALESCE(SUM(pdf_bytes > 0), 0) FROM reports"
+        ).fetchone()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "reports": count,
+            "rendered_reports": rendered,
+            "total_bytes": payload_bytes + pdf_bytes,
+            "payload_bytes": payload_bytes,
+            "pdf_bytes": pdf_bytes,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age,
+            "evictions": counters.get("evictions", 0),
+            "evicted_bytes": counters.get("evicted_bytes", 0),
+        }
@@ -0,0 +1,224 @@
+# scheduler.py
+
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+from metrics import add_timing, observe
+
+load_dotenv()
+
+# Priority lanes: interactive requests always go ahead of background refreshes.
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_CODES = {"rateLimited", "maximumResultsReached"}
+
+# Per-provider defaults: sustained requests per second, burst size and concurrent calls.
+PROVIDER_DEFAULTS = {
+    "gemini": {"rate": 5.0, "burst": 10, "concurrency": 8},
+    "newsapi": {"rate": 1.0, "burst": 5, "concurrency": 4},
+    "twitter": {"rate": 0.5, "burst": 5, "concurrency": 4},
+    "youtube": {"rate": 5.0, "burst": 10, "concurrency": 8},
+    "yfinance": {"rate": 2.0, "burst": 5, "concurrency": 4},
+}
+MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("PROVIDER_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("PROVIDER_BACKOFF_MAX", "20"))
+
+def _setting(provider, name, cast):
+    """Reads e.g. GEMINI_RATE_PER_SEC / GEMINI_BURST / GEMINI_MAX_CONCURRENCY, falling back to the defaults."""
+    env_names = {"rate": "RATE_PER_SEC", "burst": "BURST", "concurrency": "MAX_CONCURRENCY"}
+    value = os.getenv(f"{provider.upper()}_{env_names[name]}")
+    return cast(value) if value else cast(PROVIDER_DEFAULTS.get(provider, PROVIDER_DEFAULTS["gemini"])[name])
+
+class ProviderLimiter:
+    """A token bucket plus a concurrency cap for one upstream provider."""
+
+    def __init__(self, name, rate, burst, concurrency):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._active = 0
+        self._waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._cond = threading.Condition()
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0, "wait_seconds": 0.0}
+        self.lane_calls = {INTERACTIVE: 0, BACKGROUND: 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self, priority):
+        started = time.monotonic()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    self._refill()
+                    blocked_by_lane = priority == BACKGROUND and self._waiting[INTERACTIVE] > 0
+                    if not blocked_by_lane and self._tokens >= 1 and self._active < self.concurrency:
+                        self._tokens -= 1
+                        self._active += 1
+                        break
+                    wait_for = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.05
+                    self._cond.wait(timeout=max(wait_for, 0.01))
+            finally:
+                self._waiting[priority] -= 1
+            self.stats["wait_seconds"] += time.monotonic() - started
+
+    def count(self, name, amount=1):
+        with self._cond:
+            self.stats[name] += amount
+
+    def count_call(self, priority):
+        with self._cond:
+            self.stats["calls"] += 1
+            self.lane_calls[priority] += 1
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider):
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(provider)
+            if limiter is None:
+                limiter = _limiters[provider] = ProviderLimiter(
+                    provider, _setting(provider, "rate", float), _setting(provider, "burst", int), _setting(provider, "concurrency", int))
+    return limiter
+
+@contextmanager
+def request_priority(level):
+    """Runs the enclosed calls in the given lane (INTERACTIVE or BACKGROUND)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """executor.submit that carries the caller's priority lane into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def _status_of(error):
+    """Best-effort HTTP status (or provider error code) of an exception raised by a client library."""
+    for owner in (error, getattr(error, "response", None), getattr(error, "resp", None)):
+        if owner is None:
+            continue
+        for attribute in ("status_code", "status", "code"):
+            value = getattr(owner, attribute, None)
+            if callable(value):
+                try:
+                    value = value()
+                except TypeError:
+                    continue
+            if isinstance(value, int) and not isinstance(value, bool):
+                return value
+            if isinstance(value, str):
+                if value.isdigit():
+                    return int(value)
+                if value in RETRYABLE_CODES:
+                    return 429
+    get_code = getattr(error, "get_code", None)  # NewsAPIException
+    if callable(get_code) and get_code() in RETRYABLE_CODES:
+        return 429
+    return None
+
+def _is_timeout(error):
+    return isinstance(error, TimeoutError) or type(error).__name__ in ("Timeout", "ReadTimeout", "ConnectTimeout", "DeadlineExceeded")
+
+def _is_retryable(error):
+    if isinstance(error, ConnectionError) or _is_timeout(error):
+        return True
+    name = type(error).__name__
+    if name in ("ConnectionError", "ServiceUnavailable", "TooManyRequests", "ResourceExhausted"):
+        return True
+    return _status_of(error) in RETRYABLE_STATUS
+
+def _call_timeout(kwargs):
+    """The per-call timeout the caller passed, as `timeout=` or `request_options={"timeout": ...}`, if any."""
+    options = kwargs.get("request_options")
+    timeout = options.get("timeout") if isinstance(options, dict) else kwargs.get("timeout")
+    return timeout if isinstance(timeout, (int, float)) and not isinstance(timeout, bool) else None
+
+def _with_timeout(kwargs, timeout):
+    if isinstance(kwargs.get("request_options"), dict):
+        return {**kwargs, "request_options": {**kwargs["request_options"], "timeout": timeout}}
+    return {**kwargs, "timeout": timeout}
+
+def call_provider(provider, fn, *args, **kwargs):
+    """
+    Runs one outbound call through the provider's token bucket and
+    concurrency cap. 429s, 5xx responses and connection errors are retried
+    with exponential backoff and full jitter; anything else, or the last
+    failed attempt, is raised to the caller.
+
+    A call that carries its own timeout is bounded by it as a whole: hitting
+    the timeout is not retried, and retries only get the time that is left.
+    """
+    limiter = get_limiter(provider)
+    priority = _priority.get()
+    started = time.monotonic()
+    timeout = _call_timeout(kwargs)
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            limiter.acquire(priority)
+            try:
+                if timeout is not None and attempt:
+                    remaining = timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        raise TimeoutError(f"{provider} call used up its {timeout}s timeout")
+                    kwargs = _with_timeout(kwargs, remaining)
+                limiter.count_call(priority)
+                return fn(*args, **kwargs)
+            except Exception as e:
+                retryable = _is_retryable(e)
+                if _status_of(e) == 429:
+                    limiter.count("throttled")
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+                if timeout is not None and (_is_timeout(e) or time.monotonic() - started + delay >= timeout):
+                    retryable = False
+                if not retryable or attempt == MAX_RETRIES:
+                    limiter.count("failures")
+                    raise
+                limiter.count("retries")
+                print(f"🟡 {provider} call failed ({e}); retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s.")
+            finally:
+                limiter.release()
+            time.sleep(delay)
+    finally:
+        seconds = time.monotonic() - started
+        observe("provider_call_seconds", seconds, provider=provider, lane=priority)
+        # Summed over parallel calls, so this can exceed the request's wall time.
+        add_timing(f"{provider}_call_seconds", seconds)
+
+def scheduler_stats():
+    """Call, retry, throttle and failure counts plus time spent waiting, per provider."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    stats = {}
+    for limiter in limiters:
+        with limiter._cond:
+            stats[limiter.name] = {**limiter.stats, "wait_seconds": round(limiter.stats["wait_seconds"], 3), "calls_by_lane": dict(limiter.lane_calls)}
+    return stats
+
+def lane_calls(lane):
+    """Upstream calls (attempts, all providers together) made in one priority lane by this process."""
+    return sum(stats["calls_by_lane"][lane] for stats in scheduler_stats().values())
@@ -1,27 +1,47 @@
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import google.generativeai as genai
 
+from aggregate import UNCLASSIFIED_REASONS
+from cache import TieredCache, make_key
+from clients import get_gemini_model
+from scheduler import call_provider, submit_with_context
+import lexicon
+
 # Load environment variables from the .env file
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
 # Configure the generative AI model
 genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash')
+MODEL_NAME = 'gemini-1.5-flash'
 
-def analyze_sentiment(text):
-    """
-    Analyzes the sentiment of a given text, categorizes its topic,
-    and extracts the key driver for that sentiment.
-    """
-    if not text or not isinstance(text, str) or not text.strip():
-        return "Label: neutral\nCategory: Other\nReason: No text provided"
+# Number of snippets sent in a single batched prompt, and how many batches run at once.
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "25"))
+SENTIMENT_BATCH_WORKERS = int(os.getenv("SENTIMENT_BATCH_WORKERS", "4"))
 
-    # Enhanced prompt to include categorization
-    prompt = f"""
-    Analyze the sentiment of the following text snippet about a company.
+# Bump PROMPT_VERSION whenever the prompt or model changes so stale labels are not reused.
+PROMPT_VERSION = f"{MODEL_NAME}:v3"
+sentiment_cache = TieredCache(
+    "sentiment",
+    ttl=float(os.getenv("SENTIMENT_CACHE_TTL", str(7 * 24 * 3600))),
+    max_memory_entries=int(os.getenv("SENTIMENT_CACHE_MEMORY_ENTRIES", "20000")),
+    max_disk_entries=int(os.getenv("SENTIMENT_CACHE_MAX_ENTRIES", "500000")),
+)
+
+# The local lexicon tier labels clear-cut items itself and escalates the rest to Gemini.
+LEXICON_TIER_ENABLED = os.getenv("LEXICON_TIER_ENABLED", "1") == "1"
+_tier_counts = {"lexicon": 0, "escalated": 0}
+_tier_lock = threading.Lock()
 
+VALID_LABELS = ("positive", "negative", "neutral")
+NO_TEXT_RESPONSE = "Label: neutral\nCategory: Other\nReason: No text provided"
+FAILED_RESPONSE = "Label: neutral\nCategory: Other\nReason: Analysis failed"
+
+INSTRUCTIONS = """
     1.  **Classify the sentiment**: as 'positive', 'negative', or 'neutral'.
     2.  **Identify the category**: Choose ONE category from the following list that best describes the main topic:
         - Product Quality
@@ -32,8 +52,9 @@ def analyze_sentiment(text):
         - Company News & Financials
         - Other
     3.  **Provide a brief reason**: Give a 2-4 word reason for your classification.
+"""
 
-    ---
+EXAMPLES = """
     **Example 1:**
     Text: "Amazon's quarterly earnings surpassed all analyst expectations, showing massive growth."
     Output:
@@ -54,7 +75,60 @@ def analyze_sentiment(text):
     Label: negative
     Category: Website & App Experience
     Reason: confusing update
+"""
+
+def _has_text(text):
+    return bool(text) and isinstance(text, str) and bool(text.strip())
+
+def sentiment_cache_key(text):
+    """Content-addressed key: the normalized text as sent to the model, plus the prompt version."""
+    normalized = " ".join(text[:800].lower().split())
+    return make_key(PROMPT_VERSION, normalized)
+
+def _is_cacheable(record):
+    return record["reason"] not in UNCLASSIFIED_REASONS
+
+def _fields(raw_sentiment):
+    """
+    The Label / Category / Reason lines that are actually present, with
+    markdown emphasis such as '**Label:** positive' stripped.
+    """
+    fields = {}
+    for line in raw_sentiment.strip().split('\n'):
+        line = line.replace('*', '').strip()
+        name, sep, value = line.partition(':')
+        name = name.strip().lower()
+        if sep and name in ("label", "category", "reason") and name not in fields:
+            fields[name] = value.strip()
+    if "label" in fields:
+        fields["label"] = fields["label"].lower().strip(" .")
+    return fields
+
+def parse_sentiment(raw_sentiment):
+    """
+    Parses a 'Label / Category / Reason' block into a dict. Missing fields
+    fall back to neutral / Other / N/A.
+    """
+    try:
+        fields = _fields(raw_sentiment)
+        return {"label": fields.get("label", "neutral"), "category": fields.get("category", "Other"), "reason": fields.get("reason", "N/A")}
+    except Exception:
+        return {"label": "neutral", "category": "Other", "reason": "Parsing failed"}
+
+def analyze_sentiment(text):
+    """
+    Analyzes the sentiment of a given text, categorizes its topic,
+    and extracts the key driver for that sentiment.
+    """
+    if not _has_text(text):
+        return NO_TEXT_RESPONSE
 
+    # Enhanced prompt to include categorization
+    prompt = f"""
+    Analyze the sentiment of the following text snippet about a company.
+{INSTRUCTIONS}
+    ---
+{EXAMPLES}
     ---
     Now, analyze this text:
     Text: "{text[:800]}"
@@ -62,11 +136,165 @@ def analyze_sentiment(text):
     """
 
     try:
-        response = model.generate_content(prompt)
+        response = call_provider("gemini", get_gemini_model(MODEL_NAME).generate_content, prompt)
         # Ensure a default response if the model output is not as expected
-        if "Label:" not in response.text or "Category:" not in response.text:
-             return "Label: neutral\nCategory: Other\nReason: Analysis failed"
+        fields = _fields(response.text)
+        if fields.get("label") not in VALID_LABELS or "category" not in fields:
+             return FAILED_RESPONSE
         return response.text.strip()
     except Exception as e:
         print(f"🔴 An error occurred during the sentiment analysis API call: {e}")
-        return "Label: neutral\nCategory: Other\nReason: Analysis failed"
+        return FAILED_RESPONSE
+
+# "[3]" on its own line, but also "**[3]**" or "[3] Label: positive"; the rest of the line belongs to the record.
+_RECORD_HEADER = re.compile(r"^[ \t*#]*\[(\d+)\][ \t*:.)]*", re.MULTILINE)
+
+def _parse_batch_response(response_text, size):
+    """
+    Splits a batched response into per-index records. Only records that carry
+    a valid label and a category are returned; anything else is left out so
+    the caller can retry it on its own.
+    """
+    records = {}
+    headers = list(_RECORD_HEADER.finditer(response_text))
+    for position, header in enumerate(headers):
+        index = int(header.group(1)) - 1
+        end = headers[position + 1].start() if position + 1 < len(headers) else len(response_text)
+        block = response_text[header.end():end]
+        if not 0 <= index < size:
+            continue
+        fields = _fields(block)
+        # A record without its own Label line would otherwise default to neutral and be cached as such.
+        if fields.get("label") in VALID_LABELS and "category" in fields:
+            records[index] = {"label": fields["label"], "category": fields["category"], "reason": fields.get("reason", "N/A")}
+    return records
+
+def _classify_batch(texts):
+    """Classifies up to SENTIMENT_BATCH_SIZE snippets with a single model call."""
+    snippets = "\n".join(f'[{i}] "{text[:800]}"' for i, text in enumerate(texts, start=1))
+    prompt = f"""
+    Analyze the sentiment of each of the following {len(texts)} numbered text snippets about a company.
+    For EVERY snippet:
+{INSTRUCTIONS}
+    ---
+{EXAMPLES}
+    ---
+    Answer with one block per snippet, in order, starting each block with its number in
+    square brackets on its own line, exactly like this:
+    [1]
+    Label: positive
+    Category: Product Quality
+    Reason: reliable hardware
+
+    Now, analyze these snippets:
+{snippets}
+    Output:
+    """
+
+    try:
+        response = call_provider("gemini", get_gemini_model(MODEL_NAME).generate_content, prompt)
+        records = _parse_batch_response(response.text, len(texts))
+    except Exception as e:
+        # The scheduler has already retried throttling and server errors; retrying
+        # every snippet on its own would only multiply the load on a struggling API.
+        print(f"🔴 An error occurred during the batched sentiment analysis API call: {e}")
+        return [parse_sentiment(FAILED_RESPONSE) for _ in texts]
+
+    missing = [i for i in range(len(texts)) if i not in records]
+    if missing:
+        print(f"🟡 {len(missing)} of {len(texts)} batched sentiment results could not be parsed, retrying them individually.")
+    for i in missing:
+        records[i] = parse_sentiment(analyze_sentiment(texts[i]))
+    return [records[i] for i in range(len(texts))]
+
+def analyze_sentiment_batch(texts, batch_size=None, on_progress=None):
+    """
+    Classifies many snippets at once. Snippets are grouped into numbered
+    prompts of `batch_size` entries, and the records are matched back by index.
+    Returns one {'label', 'category', 'reason'} dict per input text, in order.
+    `on_progress(indexes, records)` is called each time a group of snippets
+    has been labelled (cached and empty snippets first, then every batch).
+    """
+    batch_size = batch_size or SENTIMENT_BATCH_SIZE
+    results = [parse_sentiment(NO_TEXT_RESPONSE) for _ in texts]
+
+    # Identical snippets share one cache lookup and, on a miss, one classification.
+    positions = {}
+    for i, text in enumerate(texts):
+        if _has_text(text):
+            positions.setdefault(sentiment_cache_key(text), []).append(i)
+
+    pending = []
+    for key, indexes in positions.items():
+        cached = sentiment_cache.get(key)
+        if cached is None:
+            pending.append(key)
+            continue
+        for i in indexes:
+            results[i] = dict(cached)
+
+    if on_progress is not None:
+        waiting = {i for key in pending for i in positions[key]}
+        ready = [i for i in range(len(texts)) if i not in waiting]
+        on_progress(ready, [results[i] for i in ready])
+    if not pending:
+        return results
+
+    batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+    with ThreadPoolExecutor(max_workers=min(SENTIMENT_BATCH_WORKERS, len(batches))) as executor:
+        futures = [submit_with_context(executor, _classify_batch, [texts[positions[key][0]] for key in batch]) for batch in batches]
+        for batch, future in zip(batches, futures):
+            records = future.result()
+            for key, record in zip(batch, records):
+                if _is_cacheable(record):
+                    sentiment_cache.set(key, record)
+                for i in positions[key]:
+                    results[i] = dict(record)
+            if on_progress is not None:
+                labelled = [i for key in batch for i in positions[key]]
+                on_progress(labelled, [results[i] for i in labelled])
+    return results
+
+def classify_sentiment(texts, on_progress=None):
+    """
+    Tiered classification. Every snippet is scored locally with the VADER
+    lexicon; clearly positive or negative ones are labelled right away, and
+    only low-confidence or near-neutral ones are sent to analyze_sentiment_batch.
+    Returns the same records as analyze_sentiment_batch, in order.
+    """
+    if not LEXICON_TIER_ENABLED:
+        return analyze_sentiment_batch(texts, on_progress=on_progress)
+
+    results = [parse_sentiment(NO_TEXT_RESPONSE) for _ in texts]
+    labels = lexicon.confident_labels(*lexicon.score_texts(texts))
+    local = [i for i, text in enumerate(texts) if labels[i] and _has_text(text)]
+    for i in local:
+        results[i] = {"label": labels[i], "category": lexicon.guess_category(texts[i]), "reason": lexicon.explain(texts[i], labels[i])}
+    escalated = [i for i, text in enumerate(texts) if _has_text(text) and not labels[i]]
+
+    with _tier_lock:
+        _tier_counts["lexicon"] += len(local)
+        _tier_counts["escalated"] += len(escalated)
+    # Snippets without text are already final (neutral), like the cached ones in analyze_sentiment_batch.
+    ready = local + [i for i, text in enumerate(texts) if not _has_text(text)]
+    if on_progress is not None and ready:
+        on_progress(ready, [results[i] for i in ready])
+
+    def forward_progress(indexes, records):
+        on_progress([escalated[i] for i in indexes], records)
+
+    records = analyze_sentiment_batch([texts[i] for i in escalated], on_progress=forward_progress if on_progress else None)
+    for i, record in zip(escalated, records):
+        results[i] = record
+    return results
+
+def tier_stats():
+    """How many items each tier has labelled in this process, and the escalation rate."""
+    with _tier_lock:
+        lexicon_count, escalated = _tier_counts["lexicon"], _tier_counts["escalated"]
+    total = lexicon_count + escalated
+    return {
+        "lexicon_labelled": lexicon_count,
+        "escalated": escalated,
+        "escalation_rate": round(escalated / total, 4) if total else 0.0,
+    }
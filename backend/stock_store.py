@@ -0,0 +1,159 @@
+# stock_store.py
+
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+
+from scheduler import call_provider
+
+load_dotenv()
+STOCK_DB_PATH = os.getenv("STOCK_DB_PATH", os.path.join("cache", "stocks.sqlite3"))
+# How often a ticker is checked upstream for new daily bars.
+STOCK_REFRESH_INTERVAL = float(os.getenv("STOCK_REFRESH_INTERVAL", "3600"))
+STOCK_HISTORY_DAYS = int(os.getenv("STOCK_HISTORY_DAYS", "100"))
+
+def yfinance_source(tickers, start):
+    """
+    Downloads daily closes for every ticker in one batched request.
+    Returns {ticker: (dates, closes)} with ISO date strings and floats.
+    """
+    import pandas as pd
+    import yfinance as yf
+
+    frame = call_provider(
+        "yfinance", yf.download, tickers=list(tickers), start=start.isoformat(),
+        group_by="ticker", auto_adjust=True, progress=False, threads=True,
+    )
+    bars = {}
+    if frame is None or frame.empty:
+        return bars
+    for ticker in tickers:
+        if isinstance(frame.columns, pd.MultiIndex):
+            if ticker not in frame.columns.get_level_values(0):
+                continue
+            closes = frame[ticker]["Close"]
+        else:
+            closes = frame["Close"]
+        closes = closes.dropna()
+        # Vectorized conversion of the whole column instead of iterating row by row.
+        bars[ticker] = (closes.index.strftime("%Y-%m-%d").tolist(), closes.to_numpy(dtype=float).tolist())
+    return bars
+
+_source = yfinance_source
+
+def set_price_source(source):
+    """
+    Replaces the upstream price source, e.g. with an offline stub for tests
+    or benchmarks. `source(tickers, start_date)` must return
+    {ticker: (dates, closes)}. Passing None restores yfinance.
+    """
+    global _source
+    _source = source or yfinance_source
+
+class StockStore:
+    """
+    A local sqlite store of daily closing prices. Each request only downloads
+    the days from the newest stored bar on, for all stale tickers at once, and
+    tickers checked within STOCK_REFRESH_INTERVAL are served from disk alone.
+    """
+
+    def __init__(self, db_path=STOCK_DB_PATH, refresh_interval=STOCK_REFRESH_INTERVAL):
+        self.db_path = db_path
+        self.refresh_interval = refresh_interval
+        self._local = threading.local()
+        # Serializes syncs so concurrent requests for the same tickers download them once.
+        self._sync_lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS daily_bars ("
+                "ticker TEXT NOT NULL, date TEXT NOT NULL, close REAL NOT NULL, PRIMARY KEY (ticker, date))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS ticker_sync (ticker TEXT PRIMARY KEY, synced_at REAL NOT NULL)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _stale_tickers(self, tickers):
+        """Maps each ticker that needs syncing to the first date that has to be downloaded."""
+        conn = self._connection()
+        cutoff = time.time() - self.refresh_interval
+        window_start = datetime.date.today() - datetime.timedelta(days=STOCK_HISTORY_DAYS)
+        stale = {}
+        for ticker in tickers:
+            synced = conn.execute("SELECT synced_at FROM ticker_sync WHERE ticker = ?", (ticker,)).fetchone()
+            if synced and synced[0] >= cutoff:
+                continue
+            latest = conn.execute("SELECT MAX(date) FROM daily_bars WHERE ticker = ?", (ticker,)).fetchone()[0]
+            if latest:
+                # The newest stored bar is downloaded again: it may be an intraday price from a sync during market hours.
+                stale[ticker] = max(datetime.date.fromisoformat(latest), window_start)
+            else:
+                stale[ticker] = window_start
+        return stale
+
+    def sync(self, tickers):
+        """Downloads the missing recent days for every stale ticker, one batched request per start date."""
+        with self._sync_lock:
+            stale = self._stale_tickers(tickers)
+            if not stale:
+                return
+            by_start = {}
+            for ticker, start in stale.items():
+                by_start.setdefault(start, []).append(ticker)
+
+            conn = self._connection()
+            for start, group in by_start.items():
+                if start > datetime.date.today():
+                    bars = {}
+                else:
+                    bars = _source(group, start)
+                for ticker, (dates, closes) in bars.items():
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO daily_bars (ticker, date, close) VALUES (?, ?, ?)",
+                        zip([ticker] * len(dates), dates, closes),
+                    )
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO ticker_sync (ticker, synced_at) VALUES (?, ?)",
+                    [(ticker, now) for ticker in group],
+                )
+                conn.commit()
+
+    def history(self, tickers, days=STOCK_HISTORY_DAYS):
+        """
+        Returns {ticker: [{"date", "price"}, ...]} covering the last `days`
+        calendar days, syncing stale tickers first. Tickers without data map to None.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return {}
+        try:
+            self.sync(tickers)
+        except Exception as e:
+            # Serve whatever is already stored rather than failing the whole request.
+            print(f"🔴 Could not refresh stock data for {', '.join(tickers)}: {e}")
+        since = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+        placeholders = ",".join("?" * len(tickers))
+        rows = self._connection().execute(
+            f"SELECT ticker, date, close FROM daily_bars WHERE ticker IN ({placeholders}) AND date >= ? ORDER BY ticker, date",
+            (*tickers, since),
+        ).fetchall()
+        result = {ticker: None for ticker in tickers}
+        for ticker, date, close in rows:
+            if result[ticker] is None:
+                result[ticker] = []
+            result[ticker].append({"date": date, "price": close})
+        return result
+
+stock_store = StockStore()
@@ -1,42 +1,146 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from google.api_core import client_options
 from google.api_core import retry
 from dotenv import load_dotenv
 
+from cache import TieredCache, make_key
+from clients import get_gemini_model
+from scheduler import call_provider, submit_with_context
+
 load_dotenv()
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
+MODEL_NAME = "models/gemini-1.5-flash"
+SUMMARY_PROMPT_VERSION = "v1"
+# Rough input budgets in tokens (estimated at ~4 characters per token).
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "6000"))
+SUMMARY_REDUCE_TOKEN_BUDGET = int(os.getenv("SUMMARY_REDUCE_TOKEN_BUDGET", "4000"))
+SUMMARY_TIMEOUT = float(os.getenv("SUMMARY_TIMEOUT", "60"))
+SUMMARY_MAP_WORKERS = int(os.getenv("SUMMARY_MAP_WORKERS", "4"))
+
+# Per-company partial summaries are reused across runs while their inputs are unchanged.
+summary_cache = TieredCache(
+    "summary",
+    ttl=float(os.getenv("SUMMARY_CACHE_TTL", "1800")),
+    max_memory_entries=500,
+    max_disk_entries=int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "20000")),
+)
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def _item_line(article):
+    # Items that stand for a cluster of near-duplicates carry a weight (the cluster size).
+    return (
+        f"{article.get('title', '')}: {article.get('description', '')}"
+        + (f" (reported {article['weight']} times)" if article.get("weight", 1) > 1 else "")
+    )
+
+def _rank(article):
+    """Widely repeated, clearly positive/negative and titled items are kept first."""
+    return (
+        article.get("weight", 1),
+        article.get("sentiment") in ("positive", "negative"),
+        bool(article.get("title")),
+    )
+
+def select_lines(articles, token_budget):
+    """Ranks the items and keeps as many prompt lines as fit in `token_budget`."""
+    lines, used = [], 0
+    for article in sorted((a for a in articles if a.get("description")), key=_rank, reverse=True):
+        line = _item_line(article)[:600]
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            continue
+        lines.append(line)
+        used += cost
+    return lines
+
+def _generate(prompt):
+    model = get_gemini_model(MODEL_NAME)
+    # Keep every call bounded so a compare run finishes in predictable time.
+    response = call_provider("gemini", model.generate_content, prompt, request_options={"timeout": SUMMARY_TIMEOUT})
+    return response.text.strip()
+
 def generate_summary(company_name, articles):
     """
     Generates a summary using the Gemini API with a specific timeout.
+    The input is ranked and trimmed to SUMMARY_TOKEN_BUDGET first.
     """
     if not articles:
         return "No articles found to summarize."
-    
-    combined_text = "\n".join(
-        f"{article.get('title', '')}: {article.get('description', '')}"
-        for article in articles if article.get("description")
-    )
+
+    combined_text = "\n".join(select_lines(articles, SUMMARY_TOKEN_BUDGET))
 
     prompt = (
         f"Summarize the public perception and recent news about {company_name}:\n{combined_text}"
     )
 
     try:
-        model = genai.GenerativeModel(model_name="models/gemini-1.5-flash")
-        
-        # --- THIS IS THE FIX: SET A 60-SECOND TIMEOUT ---
-        request_options = {"timeout": 60}
-        
-        # Pass the options to the generate_content method
-        response = model.generate_content(
-            prompt,
-            request_options=request_options
-        )
-        
-        return response.text.strip()
+        return _generate(prompt)
     except Exception as e:
         # This will catch the timeout error and other exceptions
         return f"Error generating summary: {str(e)}"
 
+def _partial_summary(query, articles):
+    """Map step: a short, cached summary of one company's items."""
+    lines = select_lines(articles, SUMMARY_TOKEN_BUDGET)
+    if not lines:
+        return None
+    key = make_key(SUMMARY_PROMPT_VERSION, MODEL_NAME, query.lower(), *lines)
+    cached = summary_cache.get(key)
+    if cached is not None:
+        return cached
+
+    combined_text = "\n".join(lines)
+    prompt = (
+        f"Summarize the public perception and recent news about {query} in one concise paragraph, "
+        f"noting the main positive and negative themes:\n{combined_text}"
+    )
+    summary = _generate(prompt)
+    summary_cache.set(key, summary)
+    return summary
+
+def generate_summary_map_reduce(topic, articles_by_query):
+    """
+    Summarizes a multi-company analysis in bounded time. Each company's items
+    are ranked, trimmed to the token budget and summarized in parallel (map);
+    the partial summaries are then merged into one overview (reduce). With a
+    single company the partial summary is the result.
+    """
+    articles_by_query = {query: items for query, items in articles_by_query.items() if items}
+    if not articles_by_query:
+        return "No articles found to summarize."
+
+    partials, errors = {}, []
+    with ThreadPoolExecutor(max_workers=min(SUMMARY_MAP_WORKERS, len(articles_by_query))) as executor:
+        futures = {query: submit_with_context(executor, _partial_summary, query, items) for query, items in articles_by_query.items()}
+        for query, future in futures.items():
+            try:
+                partial = future.result()
+            except Exception as e:
+                print(f"🔴 Summarizing '{query}' failed: {e}")
+                errors.append(str(e))
+                continue
+            if partial:
+                partials[query] = partial
+
+    if not partials:
+        return f"Error generating summary: {errors[0]}" if errors else "No articles found to summarize."
+    if len(articles_by_query) == 1:
+        return next(iter(partials.values()))
+
+    budget_per_query = max(SUMMARY_REDUCE_TOKEN_BUDGET // len(partials), 1) * 4
+    combined_text = "\n\n".join(f"{query}:\n{partial[:budget_per_query]}" for query, partial in partials.items())
+    prompt = (
+        f"Using the per-company summaries below, write an overall summary of {topic}, "
+        f"comparing public perception and recent news across the companies:\n{combined_text}"
+    )
+    try:
+        return _generate(prompt)
+    except Exception as e:
+        print(f"🔴 Merging the partial summaries failed: {e}")
+        # Fall back to the partial summaries so the user still gets something useful.
+        return "\n\n".join(f"{query}: {partial}" for query, partial in partials.items())
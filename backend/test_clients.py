@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+import clients
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    clients.reset_clients()
+    yield
+    clients.reset_clients()
+
+def test_one_client_per_process():
+    first = clients.get_newsapi_client("key")
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(clients.get_newsapi_client("key"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(client is first for client in seen)
+
+def test_concurrent_first_use_builds_once():
+    built = []
+    barrier = threading.Barrier(8)
+
+    def factory():
+        built.append(object())
+        return built[-1]
+
+    def get():
+        barrier.wait()
+        clients._get_shared("fake", "key", factory)
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
+
+def test_override_is_returned_until_reset():
+    real = clients.get_newsapi_client("key")
+    fake = object()
+    clients.override_client("newsapi", fake)
+    assert clients.get_newsapi_client("key") is fake
+    assert clients.get_newsapi_client("other-key") is fake
+
+    clients.reset_clients()
+    rebuilt = clients.get_newsapi_client("key")
+    assert rebuilt is not fake
+    assert rebuilt is not real
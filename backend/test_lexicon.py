@@ -0,0 +1,15 @@
+import pytest
+
+from lexicon import guess_category
+
+@pytest.mark.parametrize("text, category", [
+    ("So happy with my new phone", "Other"),
+    ("This is an ideal laptop", "Other"),
+    ("Apple announced a new keynote date", "Other"),
+    ("The app keeps crashing after the update", "Website & App Experience"),
+    ("Great deal, the price dropped again", "Price & Value"),
+    ("Two packages arrived late", "Delivery & Shipping"),
+    ("Customer care never answered about my refund", "Customer Service"),
+])
+def test_guess_category_matches_whole_words(text, category):
+    assert guess_category(text) == category
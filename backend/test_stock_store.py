@@ -0,0 +1,56 @@
+import datetime
+
+import pytest
+
+import stock_store
+from stock_store import StockStore
+
+class StubSource:
+    """Serves one close per day from `start` to today, at the current `price`, and records every call."""
+
+    def __init__(self, price):
+        self.price = price
+        self.calls = []
+
+    def __call__(self, tickers, start):
+        self.calls.append((list(tickers), start))
+        today = datetime.date.today()
+        dates = [(start + datetime.timedelta(days=n)).isoformat() for n in range((today - start).days + 1)]
+        return {ticker: (dates, [self.price] * len(dates)) for ticker in tickers}
+
+@pytest.fixture
+def source():
+    stub = StubSource(price=100.0)
+    stock_store.set_price_source(stub)
+    yield stub
+    stock_store.set_price_source(None)
+
+def test_history_downloads_the_window_once(tmp_path, source):
+    store = StockStore(db_path=str(tmp_path / "stocks.sqlite3"), refresh_interval=3600)
+    history = store.history(["AAPL", "MSFT"], days=10)
+    assert history["AAPL"][-1] == {"date": datetime.date.today().isoformat(), "price": 100.0}
+    assert len(source.calls) == 1
+
+    store.history(["AAPL", "MSFT"], days=10)
+    assert len(source.calls) == 1
+
+def test_resync_overwrites_the_newest_stored_day(tmp_path, source):
+    store = StockStore(db_path=str(tmp_path / "stocks.sqlite3"), refresh_interval=0)
+    store.history(["AAPL"], days=10)
+
+    # The first sync stored an intraday price for today; the close differs.
+    source.price = 105.0
+    history = store.history(["AAPL"], days=10)
+    assert source.calls[-1] == (["AAPL"], datetime.date.today())
+    assert history["AAPL"][-1]["price"] == 105.0
+    assert history["AAPL"][-2]["price"] == 100.0
+
+def test_failed_sync_serves_stored_bars(tmp_path, source):
+    store = StockStore(db_path=str(tmp_path / "stocks.sqlite3"), refresh_interval=0)
+    store.history(["AAPL"], days=10)
+
+    def failing(tickers, start):
+        raise RuntimeError("rate limited")
+    stock_store.set_price_source(failing)
+    assert store.history(["AAPL"], days=10)["AAPL"][-1]["price"] == 100.0
+    assert store.history(["UNKNOWN"], days=10) == {"UNKNOWN": None}
@@ -0,0 +1,178 @@
+# ticker_index.py
+
+import bisect
+import csv
+import os
+import re
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+TICKER_LISTINGS_FILE = os.getenv(
+    "TICKER_LISTINGS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "listings.csv"))
+# Shortest input that may be completed to a longer listed name ("nvid" -> "nvidia").
+MIN_PREFIX_LENGTH = 4
+
+_LEGAL_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "plc", "llc",
+    "holdings", "holding", "group", "sa", "ag", "nv", "se", "the", "com",
+}
+_URL_HANDLE = re.compile(r"(?:youtube\.com|twitter\.com|x\.com)/(?:@|channel/|c/)?([\w.-]+)")
+_NON_WORD = re.compile(r"[^a-z0-9& ]+")
+
+def normalize(name):
+    """Lowercases, unwraps handles and profile URLs, and drops punctuation and legal suffixes."""
+    text = (name or "").strip().lower()
+    url = _URL_HANDLE.search(text)
+    if url:
+        text = url.group(1)
+    text = _NON_WORD.sub(" ", text.lstrip("@").replace("_", " "))
+    words = [word for word in text.split() if word not in _LEGAL_SUFFIXES]
+    return " ".join(words)
+
+def _squash(normalized):
+    return normalized.replace(" ", "")
+
+class TickerIndex:
+    """
+    An in-memory symbol index. Names, aliases and handles are normalized and
+    stored once in a sorted key array with a parallel array of symbol ids, so
+    exact lookups are a dict hit and prefix lookups a binary search. A symbol
+    of None marks a known company without a listed ticker.
+    """
+
+    def __init__(self):
+        self._symbols = []
+        self._symbol_ids = {}
+        self._exact = {}
+        self._handles = {}
+        # Every word of each symbol's names and aliases, for telling "apple iphone" from "apple pie".
+        self._words = {}
+        self._sorted_keys = []
+        self._sorted_ids = []
+
+    def __len__(self):
+        return len(self._exact)
+
+    def _symbol_id(self, symbol):
+        if symbol not in self._symbol_ids:
+            self._symbol_ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+        return self._symbol_ids[symbol]
+
+    def add(self, symbol, names=(), handles=()):
+        symbol_id = self._symbol_id(symbol or None)
+        for name in names:
+            normalized = normalize(name)
+            key = _squash(normalized)
+            if key:
+                self._exact.setdefault(key, symbol_id)
+                self._words.setdefault(symbol_id, set()).update(normalized.split())
+        for handle in handles:
+            key = _squash(normalize(handle))
+            if key:
+                self._handles.setdefault(key, symbol_id)
+                self._exact.setdefault(key, symbol_id)
+
+    def freeze(self):
+        """Builds the sorted prefix arrays; call after the last add()."""
+        keys = sorted(self._exact)
+        self._sorted_keys = keys
+        self._sorted_ids = [self._exact[key] for key in keys]
+
+    def _complete(self, prefix):
+        """The symbol of the single listed name starting with `prefix`, if it is unambiguous."""
+        start = bisect.bisect_left(self._sorted_keys, prefix)
+        found = set()
+        for position in range(start, len(self._sorted_keys)):
+            if not self._sorted_keys[position].startswith(prefix):
+                break
+            found.add(self._sorted_ids[position])
+            if len(found) > 1:
+                return None, False
+        if len(found) == 1:
+            return self._symbols[found.pop()], True
+        return None, False
+
+    def lookup(self, query):
+        """
+        Resolves a company name, alias, @handle or profile URL. Returns
+        (symbol, matched): matched is False when nothing in the index fits.
+        """
+        normalized = normalize(query)
+        if not normalized:
+            return None, False
+        squashed = _squash(normalized)
+
+        # 1. Exact name, alias or handle.
+        if squashed in self._exact:
+            return self._symbols[self._exact[squashed]], True
+
+        # 2. Leading words of a longer name, when the rest are words of the
+        # same company's names ("apple iphone" -> AAPL, but not "apple pie
+        # recipes"). Legal suffixes were already dropped by normalize().
+        words = normalized.split()
+        for size in range(len(words) - 1, 0, -1):
+            key = "".join(words[:size])
+            if key in self._exact:
+                symbol_id = self._exact[key]
+                if set(words[size:]) <= self._words.get(symbol_id, set()):
+                    return self._symbols[symbol_id], True
+                break
+
+        # 3. Handles that extend a listed handle ("@AppleSupport" -> "apple").
+        raw = (query or "").strip()
+        if raw.startswith("@") or _URL_HANDLE.search(raw.lower()):
+            for end in range(len(squashed) - 1, MIN_PREFIX_LENGTH - 1, -1):
+                if squashed[:end] in self._handles:
+                    return self._symbols[self._handles[squashed[:end]]], True
+
+        # 4. An unambiguous prefix of a listed name ("nvid" -> "nvidia").
+        if len(squashed) >= MIN_PREFIX_LENGTH:
+            return self._complete(squashed)
+        return None, False
+
+def load_listings(path, index=None):
+    """
+    Adds every row of a listings CSV to the index. Expected columns are
+    symbol, name, and optionally aliases and handles ('|'-separated).
+    """
+    if index is None:
+        index = TickerIndex()
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            aliases = [alias for alias in (row.get("aliases") or "").split("|") if alias]
+            handles = [handle for handle in (row.get("handles") or "").split("|") if handle]
+            index.add((row.get("symbol") or "").strip(), [row.get("name", "")] + aliases, handles)
+    return index
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index(extra_names=None):
+    """
+    The process-wide index, built on first use from TICKER_LISTINGS_FILE plus
+    `extra_names` ({name: symbol}, added after the listings).
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = TickerIndex()
+                if os.path.exists(TICKER_LISTINGS_FILE):
+                    load_listings(TICKER_LISTINGS_FILE, index)
+                else:
+                    print(f"🟡 Ticker listings file '{TICKER_LISTINGS_FILE}' not found; using the built-in names only.")
+                for name, symbol in (extra_names or {}).items():
+                    if name.startswith("@"):
+                        index.add(symbol, handles=[name])
+                    else:
+                        index.add(symbol, names=[name])
+                index.freeze()
+                _index = index
+    return _index
+
+def reset_index():
+    global _index
+    with _index_lock:
+        _index = None
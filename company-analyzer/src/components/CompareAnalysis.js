@@ -4,6 +4,7 @@ import Skeleton from 'react-loading-skeleton';
 import 'react-loading-skeleton/dist/skeleton.css';
 import DetailedSentiment from './DetailedSentiment'; // Import the new component
 import Modal from 'react-modal'; // Import Modal
+import { streamAnalysis, applyAnalysisEvent } from '../streamAnalysis';
 
 // Set the app element for react-modal accessibility
 Modal.setAppElement('#root');
@@ -99,10 +100,13 @@ const CompareAnalysis = () => {
         e.preventDefault(); const validCompanies = companies.filter(c => c.trim() !== '');
         if (validCompanies.length < 2) { setError('Please enter at least two companies.'); return; }
         setLoading(true); setError(''); setResult(null);
+        // Render each stage as it streams in instead of waiting for the whole comparison.
+        let state = null;
         try {
-            const res = await fetch('http://127.0.0.1:5000/analyze', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ companies: validCompanies }), });
-            const data = await res.json(); if (!res.ok) throw new Error(data.error || 'Error fetching data.');
-            setResult(data);
+            await streamAnalysis('/analyze/stream', { companies: validCompanies }, (event, payload) => {
+                state = applyAnalysisEvent(state, event, payload);
+                setResult({ summary: state.summary, comparison_data: state.data, report_url: state.report_url });
+            });
         } catch (err) { setError(err.message); } finally { setLoading(false); }
     };
     
@@ -127,12 +131,12 @@ const CompareAnalysis = () => {
                 </form>
             </div>
             {error && <div style={styles.error}>{error}</div>}
-            {loading && <LoadingSkeleton />}
+            {loading && !result && <LoadingSkeleton />}
             {result && (
                 <div style={styles.dashboardGrid}>
                     <Card gridArea='summary'>
                         <h3 style={styles.cardHeader}>AI Comparison Summary</h3>
-                        <p>{result.summary}</p>
+                        {result.summary ? <p>{result.summary}</p> : <Skeleton count={4} />}
                         <button onClick={() => handleDownload(result.report_url, 'comparison_report.pdf')} disabled={!result.report_url} style={styles.downloadBtn}>Download PDF</button>
                     </Card>
                     <Card gridArea='metrics'><h3 style={styles.cardHeader}>Key Metrics</h3><ComparisonTable data={result.comparison_data} onCompanyClick={openModal} /></Card>
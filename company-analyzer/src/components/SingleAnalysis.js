@@ -3,6 +3,7 @@ import { PieChart, Pie, Cell, Tooltip, ResponsiveContainer, LineChart, Line, XAx
 import Skeleton from 'react-loading-skeleton';
 import 'react-loading-skeleton/dist/skeleton.css';
 import DetailedSentiment from './DetailedSentiment'; // Import the new component
+import { streamAnalysis, applyAnalysisEvent } from '../streamAnalysis';
 
 // Helper function for robust downloads
 const handleDownload = async (reportUrl, filename) => {
@@ -87,14 +88,14 @@ const SingleAnalysis = () => {
  
     const handleSubmit = async (e) => {
         e.preventDefault(); setLoading(true); setError(""); setResult(null);
+        // Render each stage as it streams in instead of waiting for the whole analysis.
+        let state = null;
         try {
-            const res = await fetch("http://127.0.0.1:5000/analyze", {
-                method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ companies: [company] }),
+            await streamAnalysis("/analyze/stream", { companies: [company] }, (event, payload) => {
+                state = applyAnalysisEvent(state, event, payload);
+                const companyData = state.data[Object.keys(state.data)[0]] || {};
+                setResult({ company, ...companyData, summary: state.summary, report_url: state.report_url });
             });
-            const data = await res.json();
-            if (!res.ok) throw new Error(data.error || "An error occurred");
-            const companyData = data.comparison_data[Object.keys(data.comparison_data)[0]];
-            setResult({ company, ...companyData, summary: data.summary, report_url: data.report_url });
         } catch (err) { setError(err.message); } finally { setLoading(false); }
     };
     
@@ -109,12 +110,12 @@ const SingleAnalysis = () => {
                 </form>
             </div>
             {error && <div style={styles.error}>{error}</div>}
-            {loading && <LoadingSkeleton />}
+            {loading && !result && <LoadingSkeleton />}
             {result && (
                 <div style={styles.dashboardGrid}>
                     <Card gridArea="summary">
                         <h3 style={styles.cardHeader}>AI Summary: {result.company}</h3>
-                        <p style={{flexGrow: 1}}>{result.summary}</p>
+                        {result.summary ? <p style={{flexGrow: 1}}>{result.summary}</p> : <Skeleton count={4}/>}
                         <button onClick={() => handleDownload(result.report_url, `${result.company}_report.pdf`)} style={styles.downloadBtn} disabled={!result.report_url}>Download PDF</button>
                     </Card>
                     <Card gridArea="sentiment">
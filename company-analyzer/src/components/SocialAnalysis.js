@@ -3,6 +3,7 @@ import { PieChart, Pie, Cell, Tooltip, ResponsiveContainer, Legend } from "recha
 import Skeleton from 'react-loading-skeleton';
 import 'react-loading-skeleton/dist/skeleton.css';
 import DetailedSentiment from './DetailedSentiment'; // Import the new component
+import { streamAnalysis, applyAnalysisEvent } from '../streamAnalysis';
 
 // Helper function for robust downloads
 const handleDownload = async (reportUrl, filename) => {
@@ -72,14 +73,14 @@ const SocialAnalysis = () => {
     
     const handleSubmit = async (e) => {
         e.preventDefault(); setLoading(true); setError(""); setResult(null);
+        // Render each stage as it streams in instead of waiting for the whole analysis.
+        let state = null;
         try {
-            const res = await fetch("http://127.0.0.1:5000/analyze_social", {
-                method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ handles: [handle] }),
+            await streamAnalysis("/analyze_social/stream", { handles: [handle] }, (event, payload) => {
+                state = applyAnalysisEvent(state, event, payload);
+                const handleData = state.data[Object.keys(state.data)[0]] || {};
+                setResult({ handle, ...handleData, summary: state.summary, report_url: state.report_url });
             });
-            const data = await res.json();
-            if (!res.ok) throw new Error(data.error || "An error occurred");
-            const handleData = data.analysis_data[Object.keys(data.analysis_data)[0]];
-            setResult({ handle, ...handleData, summary: data.summary, report_url: data.report_url });
         } catch (err) { setError(err.message); } finally { setLoading(false); }
     };
 
@@ -94,12 +95,12 @@ const SocialAnalysis = () => {
                 </form>
             </div>
             {error && <div style={styles.error}>{error}</div>}
-            {loading && <LoadingSkeleton />}
+            {loading && !result && <LoadingSkeleton />}
             {result && (
                 <div style={styles.dashboardGrid}>
                     <Card gridArea="summary">
                         <h3 style={styles.cardHeader}>AI Summary: {result.handle}</h3>
-                        <p>{result.summary}</p>
+                        {result.summary ? <p>{result.summary}</p> : <Skeleton count={4}/>}
                         <button onClick={() => handleDownload(result.report_url, `${result.handle.replace(/@/g, '')}_social_report.pdf`)} style={styles.downloadBtn} disabled={!result.report_url}>Download PDF</button>
                     </Card>
                     <Card gridArea="sentiment">
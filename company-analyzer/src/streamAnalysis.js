@@ -0,0 +1,62 @@
+// Helpers for the streaming analysis endpoints (/analyze/stream, /analyze_social/stream).
+const API_BASE = 'http://127.0.0.1:5000';
+
+// POSTs `body` to `path` and calls onEvent(name, payload) for every Server-Sent Event received.
+export const streamAnalysis = async (path, body, onEvent) => {
+    const res = await fetch(`${API_BASE}${path}`, {
+        method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(body),
+    });
+    if (!res.ok) {
+        const data = await res.json().catch(() => ({}));
+        throw new Error(data.error || 'An error occurred');
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const chunk = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message', data = '';
+            chunk.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (!data) continue; // keep-alive comment
+            const payload = JSON.parse(data);
+            if (event === 'error') throw new Error(payload.error || 'An error occurred');
+            onEvent(event, payload);
+        }
+    }
+};
+
+const emptyQueryData = () => ({
+    articles: [], twitter_posts: [], youtube_posts: [], stock_trends: null,
+    sentiment_overview: { positive: 0, negative: 0, neutral: 0, total: 0 }, sentiment_summary_text: '',
+});
+
+// Folds one streamed event into { summary, report_url, data: { [query]: queryData }, done }.
+export const applyAnalysisEvent = (state, event, payload) => {
+    const current = state || { summary: null, report_url: null, data: {}, done: false };
+    const updateQuery = (query, changes) => ({
+        ...current, data: { ...current.data, [query]: { ...(current.data[query] || emptyQueryData()), ...changes } },
+    });
+    switch (event) {
+        case 'fetched': return updateQuery(payload.query, { [payload.source]: payload.items });
+        case 'stock_trends': return updateQuery(payload.query, { stock_trends: payload.stock_trends });
+        case 'sentiment_progress': return updateQuery(payload.query, { sentiment_overview: payload.sentiment_overview });
+        case 'sentiment': { const { query, ...queryData } = payload; return updateQuery(query, queryData); }
+        case 'summary': return { ...current, summary: payload.summary };
+        case 'report': return { ...current, report_url: payload.report_url };
+        case 'done': return {
+            summary: payload.summary, report_url: payload.report_url,
+            data: payload.comparison_data || payload.analysis_data || {}, done: true,
+        };
+        default: return current;
+    }
+};